@@ -18,6 +18,14 @@ from ion import (
     KEY_SHIFT, keydown
 )
 
+# Startup
+# The script only builds what the main menu draws before drawing it: levels
+# are decoded when played, the garage is laid out when first entered and
+# texts are made when shown. With STARTUP_TIMING on, the time from here to the
+# first frame is printed.
+STARTUP_TIMING = False
+startup_time = monotonic()
+
 
 levels = [
     [  # Level 1
@@ -67,10 +75,11 @@ random_sentences = [
 
 
 TICK = 1/30  # 30 FPS
+IDLE_TICK = 1/15  # Menus while no key is down
 speed = 6  # pixels / frame
 RESPAWN_TIME = 1
 
-percentage = 0
+percentage = 0  # Hundredths of a percent
 menu_button = 2
 max_menu_buttons = 3
 menu = "main"
@@ -78,8 +87,6 @@ attempts = 0
 percentage_label = ""
 current_level = 0
 
-start_wait = None
-
 
 # Anti-hold variables
 
@@ -89,20 +96,21 @@ clicked = False
 # Physics
 
 player_x = 50
-player_y = 172
+player_y = 172  # Where the player was last drawn
+previous_player_y = 172  # Where it was drawn the frame before
+
+map_offset_x = 0  # Where the level was last drawn
 
-map_offset_x = 0
+run = None  # State of the current attempt
 
-can_jump = True
+ORB_SIDE = 20
 
-is_jumping = False
-is_falling = False
 
-jump_velocity = 32
-air_ticks = 0
+# Drawing
 
-ORB_SIDE = 20
-took_pad = False
+DIRTY_RENDERING = True  # Only redraw what scrolling changed since the last frame
+drawn_offset = None  # map_offset_x of the last frame drawn by draw_level()
+erase_width = speed  # Pixels scrolled since the last frame drawn, speed for the first
 
 
 # Sizes
@@ -118,6 +126,8 @@ CHARACTERS_LIMIT = SCREEN_WIDTH / CHARECTER_WIDTH
 PLAYER_WIDTH = 20
 PLAYER_HEIGHT = 20
 
+HUD_BOTTOM = 20 + CHARACTER_HEIGHT  # The percentage is drawn over the level
+
 
 # Colors
 
@@ -143,19 +153,375 @@ GREY = (170, 170, 170)
 
 color_chosen = 1
 
+# Name, unlocked, color and how to unlock it: a text, or the number of the
+# level to complete, whose name is only looked up in the garage
 colors = [
     ["yellow", True, YELLOW, "Default color"],
-    ["blue", False, BLUE, "Complete \"" + levels[0][5] + "\""],
-    ["green", False, GREEN, "Complete \"" + levels[1][5] + "\""],
-    ["purple", False, PURPLE, "Complete \"" + levels[2][5] + "\""],
-    ["pink", False, PINK, "Complete \"" + levels[3][5] + "\""],
+    ["blue", False, BLUE, 0],
+    ["green", False, GREEN, 1],
+    ["purple", False, PURPLE, 2],
+    ["pink", False, PINK, 3],
     #["white", False, WHITE, "Complete every level with coins"]
 ]  # add brown, grey, black..?
 
+# The colors of levels a pack does not have cannot be earned: they are given
+for color in colors:
+    if not isinstance(color[3], str) and color[3] >= len(levels):
+        color[1] = True
+
+
+# Packed levels
+# Exported level packs can store the platforms, spikes and pads of a level as
+# a string of fixed width base 32 numbers (digits "0" to "O") instead of lists,
+# sorted by first column. They are only decoded while on screen.
+
+PLATFORM_FIELDS = (3, 1, 3, 1)  # x, y, width, height
+SPIKE_FIELDS = (3, 1, 1)  # x, y, orientation
+PAD_FIELDS = (3, 1)  # x, y
+FIELDS = (PLATFORM_FIELDS, SPIKE_FIELDS, PAD_FIELDS)
+
+def unpack_record(data: str, i: int, fields: tuple):
+    """Decodes the record starting at i, returns it and where the next starts"""
+    numbers = []
+    for digits in fields:
+        number = 0
+        for _ in range(digits):
+            number = number * 32 + ord(data[i]) - 48
+            i += 1
+        numbers.append(number)
+    return numbers, i
+
+def pack_record(numbers: list, fields: tuple):
+    """Encodes numbers as unpack_record() decodes them, the ones too large for
+    their field as its largest"""
+    digits = []
+    for i in range(len(fields)):
+        number = min(numbers[i], (1 << 5 * fields[i]) - 1)
+        for shift in range(fields[i] - 1, -1, -1):
+            digits.append(chr(48 + (number >> 5 * shift & 31)))
+    return "".join(digits)
+
+def unpack(data, fields: tuple):
+    """Decodes a packed string into lists of numbers, lists are returned as is"""
+    if not isinstance(data, str):
+        return data
+
+    objects = []
+    i = 0
+    while i < len(data):
+        numbers, i = unpack_record(data, i, fields)
+        objects.append(numbers)
+    return objects
+
+
+# Level streaming
+# A level is played through resident chunks of CHUNK_TILES tile columns. A
+# chunk holds the objects that matter for its columns and the ground support
+# of its columns. Chunks are decoded just before they scroll into view and
+# released once behind the screen, so long levels take no more memory than
+# short ones.
+# Decoded objects are their numbers followed by their first chunk and whether
+# they are "solo": nothing else paints over them, so they can be redrawn
+# incrementally.
+
+CHUNK_TILES = 16
+
+PLATFORMS = 0
+SPIKES = 1
+PADS = 2
+
+loaded_level = None
+level_sources = ([], [], [])  # Objects of each kind by first column, packed or not
+next_records = [0, 0, 0]  # Where the next object of each kind is in its source
+pending = [None, None, None]  # Objects decoded for a chunk not loaded yet
+spanning = [[], [], []]  # Objects reaching past the last loaded chunk
+first_chunk = 0  # Number of chunks[0]
+next_chunk = 0  # Number of the next chunk to load
+chunks = []  # [platforms, spikes, pads, support columns] of the resident chunks
+
+def object_columns(kind: int, numbers: list):
+    """First and last tile columns where an object can be drawn, collide or
+    carry the player"""
+    x = numbers[0]
+    if kind == PLATFORMS:
+        w = numbers[2]
+        return min(x, x + w) - 2, max(x, x + w) + 1
+    if kind == SPIKES:
+        return x - 1, x + 1
+    return x, x + 10
+
+def object_area(kind: int, numbers: list):
+    """Pixels an object can paint, eraser included, in level pixels"""
+    x, y = numbers[0], numbers[1]
+    if kind == PLATFORMS:
+        w, h = numbers[2], numbers[3]
+        return x * 10, (x + max(w, 0)) * 10 + speed, y * 32, (y + h) * 32
+    if kind == SPIKES:
+        top = y * 32 if numbers[2] else y * 32 - 20
+        return x * 10 - 10, x * 10 + 10 + speed, top, top + 20
+    top = round((y + 0.7) * 32)
+    return x * 10 + 2, x * 10 + ORB_SIDE + speed, top, top + ORB_SIDE // 2
+
+def sort_source(data, kind: int):
+    """Objects of a kind by first column. Packed strings are kept packed when
+    they already are in order."""
+    if isinstance(data, str):
+        i = 0
+        previous = None
+        while i < len(data):
+            numbers, i = unpack_record(data, i, FIELDS[kind])
+            first = object_columns(kind, numbers)[0]
+            if previous is not None and first < previous:
+                break
+            previous = first
+        else:
+            return data
+        data = unpack(data, FIELDS[kind])
+
+    return sorted(data, key=lambda numbers: object_columns(kind, numbers)[0])
+
+def load_level():
+    """Prepares the current level for streaming, unless it already is"""
+    global loaded_level, level_sources
+    if loaded_level == current_level:
+        return
+
+    level = levels[current_level]
+    level_sources = (
+        sort_source(level[0], PLATFORMS),
+        sort_source(level[1], SPIKES),
+        sort_source(level[9], PADS)
+    )
+    loaded_level = current_level
+    restart_level()
+
+def restart_level():
+    """Streams the level from its first chunk again"""
+    global first_chunk, next_chunk, chunks
+    for kind in range(3):
+        next_records[kind] = 0
+        pending[kind] = None
+        spanning[kind] = []
+    first_chunk = 0
+    next_chunk = 0
+    chunks = []
+    for active in active_sets:
+        active.reset()
+
+def read_object(kind: int):
+    """Decodes the next object of a kind, or returns None after the last one"""
+    source = level_sources[kind]
+    i = next_records[kind]
+    if i >= len(source):
+        return None
+
+    if isinstance(source, str):
+        numbers, next_records[kind] = unpack_record(source, i, FIELDS[kind])
+    else:
+        numbers = list(source[i])
+        next_records[kind] = i + 1
+
+    left, right, top, _ = object_area(kind, numbers)
+    end_x = levels[current_level][2] * 10
+    solo = (
+        top >= HUD_BOTTOM and (kind != PLATFORMS or numbers[2] >= 0)
+        and (right <= end_x or left >= end_x + 16)  # End wall
+    )
+    numbers.append(max(object_columns(kind, numbers)[0], 0) // CHUNK_TILES)
+    numbers.append(solo)
+    return numbers
+
+def find_conflicts(loaded: list, new: list):
+    """Objects that paint over each other are not solo"""
+    areas = [[object_area(kind, obj) for obj in loaded[kind]] for kind in range(3)]
+    for kind, obj in new:
+        left, right, top, bottom = object_area(kind, obj)
+        for other_kind in range(3):
+            others = loaded[other_kind]
+            for i in range(len(others)):
+                other_left, other_right, other_top, other_bottom = areas[other_kind][i]
+                if (
+                    others[i] is not obj and
+                    other_left < right and other_right > left and
+                    other_top < bottom and other_bottom > top
+                ):
+                    obj[-1] = False
+                    others[i][-1] = False
+
+def build_support(platforms: list, first_column: int):
+    """For every tile column of a chunk the player can be in, the platform tops
+    that can carry it as (top_y, left_x, right_x), sorted by top_y"""
+    columns = [[] for _ in range(CHUNK_TILES)]
+    last_column = first_column + CHUNK_TILES - 1
+    for platform in platforms:
+        x, y, w = platform[0], platform[1], platform[2]
+        left = x * 10 - 19
+        right = (x + w) * 10
+        # Landing reaches 19 pixels further than standing
+        entry = (y * 32, left, right)
+        for column in range(max(left // 10, first_column), min((right + 19) // 10, last_column) + 1):
+            columns[column - first_column].append(entry)
+
+    for column in columns:
+        column.sort()
+    return columns
+
+def load_chunk():
+    """Decodes the objects of the next chunk and builds its support columns"""
+    global next_chunk
+    chunk = next_chunk
+    last_column = chunk * CHUNK_TILES + CHUNK_TILES - 1
+
+    loaded = [[], [], [], None]
+    new = []
+    for kind in range(3):
+        objects = loaded[kind]
+        reaching = []
+        for obj in spanning[kind]:
+            objects.append(obj)
+            if object_columns(kind, obj)[1] > last_column:
+                reaching.append(obj)
+
+        if pending[kind] is None:
+            pending[kind] = read_object(kind)
+        while pending[kind] is not None and pending[kind][-2] <= chunk:
+            obj = pending[kind]
+            objects.append(obj)
+            new.append((kind, obj))
+            if object_columns(kind, obj)[1] > last_column:
+                reaching.append(obj)
+            pending[kind] = read_object(kind)
+
+        spanning[kind] = reaching
+
+    find_conflicts(loaded, new)
+    for kind, obj in new:
+        for active in active_sets:
+            active.add(kind, obj)
+    loaded[3] = build_support(loaded[PLATFORMS], chunk * CHUNK_TILES)
+    chunks.append(loaded)
+    next_chunk += 1
+
+def stream_level(map_offset_x: int):
+    """Loads the chunks up to one past the visible window and releases the
+    ones behind it"""
+    global first_chunk
+    first_tile, last_tile = get_visible_tile_range(map_offset_x)
+    first = max(first_tile, 0) // CHUNK_TILES
+    last = max(last_tile, 0) // CHUNK_TILES + 1
+
+    if first < first_chunk:
+        restart_level()
+
+    while True:
+        while chunks and first_chunk < first:
+            chunks.pop(0)
+            first_chunk += 1
+        if next_chunk > last:
+            break
+        load_chunk()
+
+# Active sets
+# Scrolling only goes forward during an attempt, so rather than testing every
+# resident object against the tile columns in view, a window of columns keeps
+# the objects in it as an active set. Each decoded object is queued as an
+# event for the scroll (-map_offset_x) at which it enters the window, and once
+# in it, as one for the scroll at which it leaves it. Events are
+# (scroll, order, kind, object) tuples, so queues sort in the order they
+# happen, objects entering together staying in level order: the order they
+# are drawn in.
+
+END_WALL = 3  # Kind of the end wall, as [x]
+
+class ActiveSet:
+    """Objects in the tile columns (scroll + left) // 10 to
+    (scroll + right) // 10. Pads stay in it for pad_tiles more columns."""
+
+    def __init__(self, left: int, right: int, pad_tiles: int):
+        self.left = left
+        self.right = right
+        self.pad_tiles = pad_tiles
+        self.reset()
+
+    def reset(self):
+        """Empties the set and queues the end wall of the current level"""
+        self.scroll = None  # Where the set was last advanced to
+        self.objects = ([], [], [], [])  # Platforms, spikes, pads, end wall
+        self.entering = []  # Events of the objects queued, by scroll
+        self.next_entering = 0  # First of them not in the set yet
+        self.leaving = []  # Events of the objects in the set, the next last
+        self.queued = 0
+        self.add(END_WALL, [levels[current_level][2]])
+
+    def add(self, kind: int, obj: list):
+        """Queues a decoded object"""
+        self.entering.append((obj[0] * 10 - self.right, self.queued, kind, obj))
+        self.queued += 1
+        self.unsorted = True
+
+    def refill(self):
+        """Queues the resident objects again, after scrolling back"""
+        self.reset()
+        for i in range(len(chunks)):
+            for kind in range(3):
+                for obj in chunks[i][kind]:
+                    # Objects covering several chunks are only queued once
+                    if i == 0 or obj[-2] == first_chunk + i:
+                        self.add(kind, obj)
+
+    def leave_scroll(self, kind: int, obj: list):
+        last_tile = obj[0]
+        if kind == PLATFORMS:
+            last_tile += obj[2]
+        elif kind == PADS:
+            last_tile += self.pad_tiles
+        return (last_tile + 1) * 10 - self.left
+
+    def advance(self, map_offset_x: int):
+        """Moves the window to map_offset_x, returns the platforms, spikes,
+        pads and end wall in it"""
+        scroll = -map_offset_x
+        if self.scroll is not None and scroll < self.scroll:
+            self.refill()
+        self.scroll = scroll
+
+        entering = self.entering
+        i = self.next_entering
+        if self.unsorted:  # Objects were queued, drop the events already passed
+            del entering[:i]
+            entering.sort()
+            self.unsorted = False
+            i = 0
+        leaving = self.leaving
+        entered = False
+        while i < len(entering) and entering[i][0] <= scroll:
+            _, order, kind, obj = entering[i]
+            self.objects[kind].append(obj)
+            leaving.append((self.leave_scroll(kind, obj), order, kind, obj))
+            entered = True
+            i += 1
+        self.next_entering = i
+
+        if entered:
+            leaving.sort(reverse=True)
+        while leaving and leaving[-1][0] <= scroll:
+            _, _, kind, obj = leaving.pop()
+            objects = self.objects[kind]
+            for j in range(len(objects)):
+                if objects[j] is obj:
+                    del objects[j]
+                    break
+        return self.objects
+
+# Objects drawn, from 2 tile columns before the screen to 4 after it
+drawn_objects = ActiveSet(-20, SCREEN_WIDTH + 20, 10)
+# Objects the player can touch during a tick, before and after scrolling
+contact_objects = ActiveSet(player_x - 20, player_x + speed + 20, 0)
+active_sets = (drawn_objects, contact_objects)
 
 # Drawing level
 
-def get_visible_tile_range():
+def get_visible_tile_range(map_offset_x: int):
     first_tile = (-map_offset_x) // TILE_SIZE_X - 2
     last_tile = first_tile + (SCREEN_WIDTH // TILE_SIZE_X) + 4
     return first_tile, last_tile
@@ -167,18 +533,55 @@ def draw_player(color: tuple[int, int, int] | None = None):
     else:
         fill_rect(player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT, player_color)
 
+def move_player(y: int):
+    """Draws the player at y, erasing it from where it was"""
+    global player_y, previous_player_y
+    if y != player_y:
+        draw_player(bg_color)
+    previous_player_y = player_y
+    player_y = y
+    draw_player(player_color)
+
+# Sprites
+# Rectangles (x, y, width, height) of each object, relative to its tile's top
+# left corner on screen, in blocks color, and (x, y, height) of its eraser in
+# background color: the pixels it scrolled away from, as wide as the level
+# scrolled since the last frame. The *_EDGES rectangles are what incremental
+# drawing paints.
+
+def spike_stripe_y(orientation: int, i: int):
+    """A spike is 5 stripes narrowing towards its tip, up or upside down"""
+    return -i * 4 + 2 * i * 4 * orientation - 4 * (1 - orientation)
+
+SPIKE_SPRITES = tuple(
+    tuple((-10 + i * 2, spike_stripe_y(o, i), 20 - i * 4, 4) for i in range(5))
+    for o in (0, 1)
+)
+SPIKE_EDGES = tuple(
+    tuple((-10 + i * 2, spike_stripe_y(o, i), min(speed, 20 - i * 4), 4) for i in range(5))
+    for o in (0, 1)
+)
+SPIKE_ERASERS = tuple(
+    tuple((10 - i * 2, spike_stripe_y(o, i), 4) for i in range(5))
+    for o in (0, 1)
+)
+
+PAD_TOP = round(0.7 * 32)  # Pads are on integer rows
+# As wide as it shows once scrolled: its eraser starts at ORB_SIDE
+PAD_SPRITE = (2, PAD_TOP, ORB_SIDE - 2, ORB_SIDE // 2)
+PAD_EDGE = (2, PAD_TOP, speed, ORB_SIDE // 2)
+PAD_ERASER = (ORB_SIDE, PAD_TOP, ORB_SIDE // 2)
+
+END_WALL_SPRITE = (0, 0, 10, SCREEN_HEIGHT)
+END_WALL_ERASER = (10, 0, SCREEN_HEIGHT)
+
 def draw_spike(x_tile: int, y_tile: int, orientation: int):
-    for i in range(5):
-        fill_rect(
-            map_offset_x + x_tile * 10 - 10 + i * 2,
-            y_tile * 32 - i * 4 + (2 * i * 4 * orientation) - 4 * (1 - orientation),
-            20 - i * 4, 4, blocks_color
-        )
-        fill_rect(
-            map_offset_x + x_tile * 10 + 10 - i * 2,
-            y_tile * 32 - i * 4 + (2 * i * 4 * orientation) - 4 * (1 - orientation),
-            speed, 4, bg_color
-        )
+    x = map_offset_x + x_tile * 10
+    y = y_tile * 32
+    for dx, dy, w, h in SPIKE_SPRITES[orientation]:
+        fill_rect(x + dx, y + dy, w, h, blocks_color)
+    for dx, dy, h in SPIKE_ERASERS[orientation]:
+        fill_rect(x + dx, y + dy, erase_width, h, bg_color)
 
 def draw_platform(x_tile: int, y_tile: int, width_tiles: int, height_tiles: int):
     fill_rect(
@@ -191,90 +594,169 @@ def draw_platform(x_tile: int, y_tile: int, width_tiles: int, height_tiles: int)
     else:
         fill_rect(
             map_offset_x + x_tile * 10 + width_tiles * 10, y_tile * 32,
-            speed, height_tiles * 32, bg_color
+            erase_width, height_tiles * 32, bg_color
         )
 
 def draw_pad(x_tile: int, y_tile: int):
-    fill_rect(
-        round(map_offset_x + (x_tile + 0.2) * 10), round((y_tile + 0.7) * 32),
-        ORB_SIDE, ORB_SIDE // 2, YELLOW
-    )
-    fill_rect(
-        map_offset_x + x_tile * 10 + ORB_SIDE, round((y_tile + 0.7) * 32),
-        speed, ORB_SIDE // 2, bg_color
+    x = map_offset_x + x_tile * 10
+    y = y_tile * 32
+    dx, dy, w, h = PAD_SPRITE
+    fill_rect(x + dx, y + dy, w, h, YELLOW)
+    dx, dy, h = PAD_ERASER
+    fill_rect(x + dx, y + dy, erase_width, h, bg_color)
+
+# Incremental drawing
+# When the level only scrolled by speed since the last frame, an object that
+# was already drawn just needs its leading edge and its eraser
+
+def draw_spike_edges(x_tile: int, y_tile: int, orientation: int):
+    x = map_offset_x + x_tile * 10
+    y = y_tile * 32
+    for dx, dy, w, h in SPIKE_EDGES[orientation]:
+        fill_rect(x + dx, y + dy, w, h, blocks_color)
+    for dx, dy, h in SPIKE_ERASERS[orientation]:
+        fill_rect(x + dx, y + dy, erase_width, h, bg_color)
+
+def draw_platform_edges(x_tile: int, y_tile: int, width_tiles: int, height_tiles: int):
+    x = map_offset_x + x_tile * 10
+    fill_rect(x, y_tile * 32, min(speed, width_tiles * 10), height_tiles * 32, blocks_color)
+    fill_rect(x + width_tiles * 10, y_tile * 32, erase_width, height_tiles * 32, bg_color)
+
+def draw_pad_edges(x_tile: int, y_tile: int):
+    x = map_offset_x + x_tile * 10
+    y = y_tile * 32
+    dx, dy, w, h = PAD_EDGE
+    fill_rect(x + dx, y + dy, w, h, YELLOW)
+    dx, dy, h = PAD_ERASER
+    fill_rect(x + dx, y + dy, erase_width, h, bg_color)
+
+def near_player(left: int, right: int, top: int, bottom: int):
+    """Did drawing or erasing the player this frame paint over an area"""
+    return (
+        left < player_x + PLAYER_WIDTH and right > player_x and (
+            top < player_y + PLAYER_HEIGHT and bottom > player_y or
+            top < previous_player_y + PLAYER_HEIGHT and bottom > previous_player_y
+        )
     )
 
 def draw_level():
-    global attempts, percentage_label, percentage
-    first_tile, last_tile = get_visible_tile_range()
+    global drawn_offset, erase_width
+    # Was the player or the level drawn over the labels
+    over_hud = min(player_y, previous_player_y) < HUD_BOTTOM
+
+    scrolled = DIRTY_RENDERING and drawn_offset == map_offset_x + speed
+    if scrolled:  # Objects up to drawn_last were on screen
+        drawn_last = get_visible_tile_range(drawn_offset)[1]
+    erase_width = speed if drawn_offset is None else drawn_offset - map_offset_x
+    drawn_offset = map_offset_x
+    platforms, spikes, pads, end_wall = drawn_objects.advance(map_offset_x)
 
     # Spikes
-    for x, y, orientation in levels[current_level][1]:
-        if first_tile <= x <= last_tile:
+    for x, y, orientation, _, solo in spikes:
+        if y * 32 - 20 < HUD_BOTTOM:
+            over_hud = True
+        if (
+            scrolled and solo and x <= drawn_last
+            and not near_player(
+                map_offset_x + x * 10 - 10, map_offset_x + x * 10 + 10 + speed,
+                y * 32 - 20 + orientation * 20, y * 32 + orientation * 20
+            )
+        ):
+            draw_spike_edges(x, y, orientation)
+        else:
             draw_spike(x, y, orientation)
 
     # Platforms
-    for x, y, w, h in levels[current_level][0]:
-        if x + w >= first_tile and x <= last_tile:
+    for x, y, w, h, _, solo in platforms:
+        if y * 32 < HUD_BOTTOM:
+            over_hud = True
+        if (
+            scrolled and solo and x <= drawn_last
+            and not near_player(
+                map_offset_x + x * 10, map_offset_x + (x + w) * 10 + speed,
+                y * 32, (y + h) * 32
+            )
+        ):
+            draw_platform_edges(x, y, w, h)
+        else:
             draw_platform(x, y, w, h)
 
     # Pads
-    for x, y in levels[current_level][9]:
-        if x + 10 >= first_tile and x <= last_tile:
+    for x, y, _, solo in pads:
+        if y * 32 < HUD_BOTTOM:
+            over_hud = True
+        if (
+            scrolled and solo and x <= drawn_last
+            and not near_player(
+                map_offset_x + x * 10, map_offset_x + x * 10 + ORB_SIDE + speed,
+                round((y + 0.7) * 32), round((y + 0.7) * 32) + ORB_SIDE // 2
+            )
+        ):
+            draw_pad_edges(x, y)
+        else:
             draw_pad(x, y)
 
     # Endwall
-    end_x = levels[current_level][2]
-    if first_tile <= end_x <= last_tile:
-        fill_rect(map_offset_x + end_x * 10, 0, 10, SCREEN_HEIGHT, GREEN)
-        fill_rect(map_offset_x + end_x * 10 + 10, 0, 6, SCREEN_HEIGHT, bg_color)
-
-    # Labels
-    attempts = levels[current_level][7]
-    attempts_label = str(attempts)
+    for end_x, in end_wall:
+        x = map_offset_x + end_x * 10
+        dx, dy, w, h = END_WALL_SPRITE
+        fill_rect(x + dx, dy, w, h, GREEN)
+        dx, dy, h = END_WALL_ERASER
+        fill_rect(x + dx, dy, erase_width, h, bg_color)
+        over_hud = True
 
-    if attempts < 100:
-        attempts_label = "0" + attempts_label
-        if attempts < 10:
-            attempts_label = "0" + attempts_label
+    if erase_width > speed:  # Erasers of several ticks can reach the player
+        draw_player()
 
+    # Labels
+    if over_hud or not scrolled:
+        draw_hud_labels()
+    draw_percentage(over_hud or not scrolled)
 
-    percentage = round(  # Full Distance / Payer Position * 100
-        (
-            ((levels[current_level][2] * 10) - (levels[current_level][2] * 10 + map_offset_x))
-            / (levels[current_level][2] * 10 - (player_x + PLAYER_WIDTH))
-            * 100
-        ), 2
-    )
+    # For testing: shows screen min and max on the x axis
+    #draw_string("%d to %d" % get_visible_tile_range(map_offset_x), 0, 20, BLACK, bg_color)
 
-    if percentage > 100:
-        percentage = 100.0
 
-    percentage_label = "{:.2f}".format(percentage)
+# HUD
+# The labels are drawn over the level, but only drawn again when their text
+# changed or when the level was drawn over them
 
-    if percentage < 10:
-        percentage_label = "0" + percentage_label
+finish_distance = 1  # Pixels to scroll before the player reaches the end wall
 
-    if len(percentage_label) < 5:
-        percentage_label += "0"
+def get_percentage(map_offset_x: int):
+    """Progress in hundredths of a percent"""
+    return min((-map_offset_x * 10000 + finish_distance // 2) // finish_distance, 10000)
 
+def draw_hud_labels():
+    """Level name and attempts, which do not change during an attempt"""
     draw_string(" " + levels[current_level][5] + " ", 0, 0, bg_color, BLACK)
-    draw_string(" Attempts:" + attempts_label + " ", 180, 0, RED, BLACK)
-    draw_centered_string(percentage_label + "%", 20, BLACK, bg_color)
+    draw_string(" Attempts:" + "%03d" % attempts + " ", 180, 0, RED, BLACK)
 
-    # For testing: shows screen min and max on the x axis
-    #draw_string(str(first_tile) + " to " + str(last_tile), 0, 20, BLACK, bg_color)
+def draw_percentage(redraw: bool):
+    global percentage, percentage_label
+    current = get_percentage(map_offset_x)
+    if redraw or current != percentage:
+        percentage = current
+        percentage_label = "%02d.%02d" % (percentage // 100, percentage % 100)
+        draw_centered_string(percentage_label + "%", 20, BLACK, bg_color)
 
 
 # Physics
 
-def check_collision():
+def find_contacts(run):
+    """Objects the player can touch during the next tick, before and after
+    scrolling. Pad triggering and death checks both test these."""
+    return contact_objects.advance(run.map_offset_x)
+
+def check_collision(run, contacts: tuple):
+    map_offset_x = run.map_offset_x
+    player_y = run.player_y
     player_tile = (-map_offset_x + player_x) // 10
     first_tile = player_tile - 2
     last_tile = player_tile + 2
 
     # Platforms
-    for x, y, w, h in levels[current_level][0]:
+    for x, y, w, h, _, _ in contacts[PLATFORMS]:
         if x > last_tile or x + w < first_tile:
             continue
 
@@ -290,7 +772,7 @@ def check_collision():
             return True
 
     # Spikes
-    for x, y, orientation in levels[current_level][1]:
+    for x, y, orientation, _, _ in contacts[SPIKES]:
         if x < first_tile or x > last_tile:
             continue
 
@@ -312,11 +794,13 @@ def check_collision():
 
     return False
 
-def check_pad_collision():
+def check_pad_collision(run, contacts: tuple):
+    map_offset_x = run.map_offset_x
+    player_y = run.player_y
     player_tile = (-map_offset_x + player_x) // 10
     first_tile = player_tile - 2
     last_tile = player_tile + 2
-    for x, y in levels[current_level][9]:
+    for x, y, _, _ in contacts[PADS]:
         if x < first_tile or x > last_tile:
             continue
 
@@ -332,25 +816,273 @@ def check_pad_collision():
         ):
             return True
 
+def ground_at(x: int):
+    column = x // 10
+    chunk = column // CHUNK_TILES - first_chunk
+    if column >= 0 and 0 <= chunk < len(chunks):
+        return chunks[chunk][3][column % CHUNK_TILES]
+    return ()
+
+def is_supported(run):
+    """Is the player standing on a platform top"""
+    feet = run.player_y + PLAYER_HEIGHT
+    x = player_x - run.map_offset_x
+    for top, left, right in ground_at(x):
+        if top > feet:
+            break
+        if top == feet and left <= x <= right:
+            return True
+    return False
+
+def is_landing(run):
+    """Does the player land on a platform top while jumping"""
+    feet = run.player_y + PLAYER_HEIGHT
+    x = player_x - run.map_offset_x
+    for top, left, right in ground_at(x):
+        if top > feet:
+            break
+        if top == feet and left < x < right + 20:
+            return True
+    return False
+
+# Simulation
+# An attempt is an explicit Run advanced one tick at a time by step(). Nothing
+# here draws or reads keys, so the same code can run headless on a computer.
+
+DIED = 1
+FINISHED = 2
+JUMPED = 4
+TOOK_PAD = 8
+
+# Jumps follow JUMP_ARC, pixels to rise on each tick in the air. A jump pad
+# starts at its first tick, a jump at its second. The jump ends early when
+# the player lands on a platform. The player hovers for up to 4 ticks at the
+# top of the arc, minus the hover ticks left over by the previous landing.
+JUMP_ARC = (64, 32, 16, 8, 4, 2, 0, 0, 0, 0, -2, -4, -8, -16, -32)
+PAD_START = 0
+JUMP_START = 1
+HOVER_START = 6
+HOVER_END = 10
+FALL_SPEED = 16  # Pixels per tick
+
+class Run:
+    def __init__(self):
+        self.player_y = 172
+        self.map_offset_x = 0
+        self.arc_tick = 0  # Next JUMP_ARC tick while jumping
+        self.air_ticks = 0  # Hover ticks done before the last landing
+        self.can_jump = True
+        self.is_jumping = False
+        self.is_falling = False
+        self.took_pad = False
+        self.ticks = 0
+
+    def copy(self):
+        other = Run()
+        other.player_y = self.player_y
+        other.map_offset_x = self.map_offset_x
+        other.arc_tick = self.arc_tick
+        other.air_ticks = self.air_ticks
+        other.can_jump = self.can_jump
+        other.is_jumping = self.is_jumping
+        other.is_falling = self.is_falling
+        other.took_pad = self.took_pad
+        other.ticks = self.ticks
+        return other
+
+    def key(self):
+        """Everything but the scroll position that decides the next ticks"""
+        return (
+            self.player_y, self.arc_tick, self.air_ticks,
+            self.can_jump, self.is_jumping, self.is_falling
+        )
+
+def advance_arc(run: Run):
+    run.player_y -= JUMP_ARC[run.arc_tick]
+    run.arc_tick += 1
+    if run.arc_tick == HOVER_START:  # Skip the hover ticks already done
+        run.arc_tick += run.air_ticks
+        run.air_ticks = 0
+
+def step(run: Run, jump: bool):
+    """Advances the current level by one tick and returns the events"""
+    events = 0
+    stream_level(run.map_offset_x - speed)
+    contacts = find_contacts(run)
+
+    if not run.is_jumping:
+        if is_supported(run):
+            run.can_jump = True
+            run.is_falling = False
+        else:
+            run.can_jump = False
+            run.is_falling = True
+
+        if run.is_falling:
+            run.player_y += FALL_SPEED
+
+        pad = check_pad_collision(run, contacts)
+        if pad:
+            run.took_pad = True
+            run.arc_tick = PAD_START
+            events |= TOOK_PAD
+        elif jump and run.can_jump:
+            run.arc_tick = JUMP_START
+
+        if (jump and run.can_jump) or pad:
+            # A pad taken while falling leaves the player stuck in the air,
+            # since the arc only goes on while can_jump
+            run.is_jumping = True
+            advance_arc(run)
+            events |= JUMPED
+
+    elif run.can_jump:
+        if is_landing(run):
+            run.is_jumping = False
+            if run.arc_tick >= HOVER_END:
+                run.air_ticks = 0
+            elif run.arc_tick >= HOVER_START:
+                run.air_ticks = run.arc_tick - HOVER_START
+            run.arc_tick = 0
+        else:
+            advance_arc(run)
+            if run.arc_tick == len(JUMP_ARC):
+                run.is_jumping = False
+                run.arc_tick = 0
+
+    run.map_offset_x -= speed
+    run.ticks += 1
+
+    if run.player_y + PLAYER_HEIGHT > SCREEN_HEIGHT or check_collision(run, contacts):
+        events |= DIED
+    elif player_x + PLAYER_WIDTH > levels[current_level][2] * 10 + run.map_offset_x:
+        events |= FINISHED
+
+    return events
+
 def respawn():
-    global current_level, map_offset_x, player_y, bg_color
-    global menu, bg_color, player_color, blocks_color, start_wait
+    global current_level, map_offset_x, player_y, bg_color, run, drawn_offset
+    global menu, bg_color, player_color, blocks_color
+    global attempts, finish_distance
 
     levels[current_level][7] += 1
+    attempts = levels[current_level][7]
+    if TELEMETRY:
+        start_telemetry()
+    finish_distance = levels[current_level][2] * 10 - (player_x + PLAYER_WIDTH)
 
     menu = "level"
-    start_wait = None
+    stop_timer()
 
     bg_color = levels[current_level][3]
     blocks_color = levels[current_level][4]
     fill_screen(bg_color)
+    drawn_offset = None
 
-    map_offset_x = 0
-    player_y = 172
+    load_level()
 
+    run = Run()
+    map_offset_x = run.map_offset_x
+    player_y = run.player_y
+    stream_level(map_offset_x)
+
+    restart_replay()
+    start_ticks()
     draw_level()
     draw_player()
 
+def play_frame(ticks: int):
+    """Plays ticks of the current attempt, up to one that ends it, then draws
+    it. Returns the jump input and the events of the last tick played."""
+    jump = False
+    events = 0
+    for _ in range(ticks):
+        jump = read_jump()
+        events = step(run, jump)
+        if events & (DIED | FINISHED):
+            break
+    draw_frame(0 if events & (DIED | FINISHED) else tick_scroll())
+    return jump, events
+
+def draw_frame(scroll: int = 0):
+    """Draws the current attempt, scrolled by scroll more pixels than its
+    last tick"""
+    global map_offset_x
+    move_player(run.player_y)
+    map_offset_x = run.map_offset_x - scroll
+    draw_level()
+
+
+# Input and replays
+# The jump input of each tick goes through read_jump(), which records it as
+# a replay: run lengths of the jump bit, starting with not jumping. [12, 3, 40]
+# is 12 ticks without jumping, 3 jumping then 40 without. A replay can be fed
+# back instead of the keys, at 30 FPS or unthrottled.
+
+REPLAY = None  # (level number, replay) to play back at startup, from 1
+UNTHROTTLED = False  # Play REPLAY back without waiting between frames
+RECORD_ATTEMPTS = False  # Print the replay of each attempt when it ends
+
+recording = []  # Replay of the current attempt
+replay = None  # Replay played back, None to play with the keys
+replay_run = 0  # Runs of the replay already started
+replay_left = 0  # Ticks left in the current run
+unthrottled = False
+
+def start_replay(level: int, runs: list, fast: bool = False):
+    """Plays a level with a replay as input, every attempt until it is exited"""
+    global current_level, replay, unthrottled
+    current_level = level
+    replay = runs
+    unthrottled = fast
+    respawn()
+
+def stop_replay():
+    global replay, unthrottled
+    replay = None
+    unthrottled = False
+
+def restart_replay():
+    """Starts recording a new attempt, and playing the replay from its start"""
+    global recording, replay_run, replay_left
+    recording = []
+    replay_run = 0
+    replay_left = 0
+
+def next_replay_jump():
+    """Jump bit of the next tick of the replay, False once it is over"""
+    global replay_run, replay_left
+    while replay_left == 0:
+        if replay_run >= len(replay):
+            return False
+        replay_left = replay[replay_run]
+        replay_run += 1
+    replay_left -= 1
+    return replay_run % 2 == 0
+
+def record_jump(jump: bool):
+    if jump and not recording:
+        recording.append(0)  # Replays start with not jumping
+    if len(recording) % 2 == jump:
+        recording.append(1)
+    else:
+        recording[-1] += 1
+
+def read_jump():
+    """Jump input of this tick, from the keys or the replay"""
+    if replay is None:
+        jump = keydown(KEY_OK) or keydown(KEY_UP)
+    else:
+        jump = next_replay_jump()
+    record_jump(jump)
+    return jump
+
+def print_attempt(result: str, ticks: int):
+    print(
+        "Level " + str(current_level + 1) + " " + result + " at tick " +
+        str(ticks) + ": " + str(recording)
+    )
+
 
 # Improved Kadinsky functions
 
@@ -377,6 +1109,93 @@ def draw_centered_string(
 
 # Pages functions
 
+# Menu layout
+# Rectangles (x, y, width, height) of the menus. The frame of a chosen button
+# is painted as the 4 rectangles around the button, so moving the selection
+# only repaints two frames. The main menu's are constants, so that startup
+# does no layout math; the garage is laid out on its first visit.
+
+def frame_rects(outer: tuple, inner: tuple):
+    """The 4 rectangles of outer that are around inner"""
+    x, y, w, h = outer
+    inner_x, inner_y, inner_w, inner_h = inner
+    return (
+        (x, y, w, inner_y - y),
+        (x, inner_y + inner_h, w, y + h - inner_y - inner_h),
+        (x, inner_y, inner_x - x, inner_h),
+        (inner_x + inner_w, inner_y, x + w - inner_x - inner_w, inner_h),
+    )
+
+# Main menu: garage, play and controls buttons, in the order of menu_button.
+# A 70 pixel play button in the middle of the screen, 50 pixel buttons in the
+# middle of the margins beside it, and a frame 10 pixels wide around the
+# chosen button.
+
+MAIN_MENU_BUTTONS = ((38, 86, 50, 50), (125, 76, 70, 70), (232, 86, 50, 50))
+MAIN_MENU_FRAMES = (
+    ((28, 76, 70, 10), (28, 136, 70, 10), (28, 86, 10, 50), (88, 86, 10, 50)),
+    ((115, 66, 90, 10), (115, 146, 90, 10), (115, 76, 10, 70), (195, 76, 10, 70)),
+    ((222, 76, 70, 10), (222, 136, 70, 10), (222, 86, 10, 50), (282, 86, 10, 50)),
+)
+# The cube, the 5 columns of the play triangle and the 7 columns of the
+# platformer controls pixel art
+MAIN_MENU_ICONS = (
+    (48, 96, 30, 30),
+    (135, 86, 10, 50), (145, 92, 10, 39), (155, 97, 10, 28), (165, 103, 10, 17), (175, 108, 10, 6),
+    (237, 104, 6, 13), (243, 98, 6, 27), (248, 91, 6, 40), (254, 111, 6, 0),
+    (260, 91, 6, 40), (266, 98, 6, 27), (271, 104, 6, 13),
+)
+
+# Levels menu
+
+PROGRESS_MARGIN = 30
+PROGRESS_Y = 110
+PROGRESS_LENGTH = SCREEN_WIDTH - (PROGRESS_MARGIN * 2)
+LEVEL_MENU_LINES = (40, 70, 150)  # Name, author and attempts
+ARROW_MARGIN = 10
+
+level_menu_color = None  # Blocks color of the level menu on screen
+
+# Garage
+
+GARAGE_CUBE = (140, 50, 40, 40)
+GARAGE_UNLOCK_LINES = (180, 200)
+
+COLOR_SIDE = 30
+CHOSEN_MARGIN = 5
+COLOR_X_MARGIN = 20
+COLOR_X_SPACE = SCREEN_WIDTH - (COLOR_X_MARGIN * 2) - COLOR_SIDE
+COLOR_Y = SCREEN_HEIGHT - 50 - COLOR_SIDE
+
+# Box of each color, the frame around it when chosen, and the boxes each frame
+# paints over when there are too many colors to fit apart
+color_boxes = None
+color_frames = None
+color_frame_overlaps = None
+
+def lay_out_garage():
+    """Spreads the color boxes evenly across the screen"""
+    global color_boxes, color_frames, color_frame_overlaps
+    color_boxes = tuple(
+        (round(COLOR_X_MARGIN + (COLOR_X_SPACE / (len(colors) - 1) * i)), COLOR_Y, COLOR_SIDE, COLOR_SIDE)
+        for i in range(len(colors))
+    )
+    color_frames = tuple(
+        frame_rects(
+            (x - CHOSEN_MARGIN, y - CHOSEN_MARGIN, w + CHOSEN_MARGIN * 2, h + CHOSEN_MARGIN * 2),
+            (x, y, w, h)
+        )
+        for x, y, w, h in color_boxes
+    )
+    color_frame_overlaps = tuple(
+        tuple(
+            j for j in range(len(color_boxes))
+            if j != i and abs(color_boxes[j][0] - color_boxes[i][0]) < COLOR_SIDE + CHOSEN_MARGIN
+        )
+        for i in range(len(color_boxes))
+    )
+
+
 def if_clicked():
     if (
         keydown(KEY_EXE) or
@@ -413,154 +1232,14 @@ def enter_main_menu():
 
     fill_screen(MAIN_MENU_COLOR)
     draw_main_menu()
+    draw_main_menu_selection(None)
 
 def draw_main_menu():
-    # Big button if chosen
-    if menu_button == 2:
-        chosen_color = WHITE
-    else:
-        chosen_color = MAIN_MENU_COLOR
-
-    CHOSEN_BIG_BUTTON_SIDE = 90
-    fill_rect(
-        round((SCREEN_WIDTH - CHOSEN_BIG_BUTTON_SIDE) / 2),
-        round((SCREEN_HEIGHT - CHOSEN_BIG_BUTTON_SIDE) / 2),
-        CHOSEN_BIG_BUTTON_SIDE,
-        CHOSEN_BIG_BUTTON_SIDE,
-        chosen_color
-    )
-
-    # Big button in the center
-    BIG_BUTTON_SIDE = 70
-    BIG_BUTTON_X_MARGIN = (SCREEN_WIDTH - BIG_BUTTON_SIDE) / 2
-    BIG_BUTTON_Y_MARGIN = (SCREEN_HEIGHT - BIG_BUTTON_SIDE) / 2
-    fill_rect(
-        round(BIG_BUTTON_X_MARGIN),
-        round(BIG_BUTTON_Y_MARGIN),
-        BIG_BUTTON_SIDE,
-        BIG_BUTTON_SIDE,
-        GREEN
-    )
-
-    # Play triangle inside the big button
-    PIXELS_X = 5
-    PIXEL_WIDTH = BIG_BUTTON_SIDE / (PIXELS_X + 2)
-    MAX_HEIGHT = PIXELS_X * PIXEL_WIDTH
-    TOTAL_MINI_PIXELS = (PIXELS_X * 2 - 1)
-    MINI_PIXEL = MAX_HEIGHT / TOTAL_MINI_PIXELS
-    current_pixels = TOTAL_MINI_PIXELS
-
-    for i in range(PIXELS_X):
-        fill_rect(
-            round(BIG_BUTTON_X_MARGIN + PIXEL_WIDTH * (i + 1)),
-            round(BIG_BUTTON_Y_MARGIN + PIXEL_WIDTH + MINI_PIXEL * i),
-            round(PIXEL_WIDTH),
-            round(current_pixels * MINI_PIXEL),
-            YELLOW
-        )
-        current_pixels -= 2
-
-    # Small left button if chosen
-    if menu_button == 1:
-        chosen_color = WHITE
-    else:
-        chosen_color = MAIN_MENU_COLOR
-
-    CHOSEN_SMALL_BUTTON_SIDE = 70
-    CHOSEN_SMALL_BUTTON_Y_MARGIN = round(
-        (SCREEN_HEIGHT - CHOSEN_SMALL_BUTTON_SIDE) / 2
-    )
-    fill_rect(
-        round((BIG_BUTTON_X_MARGIN - CHOSEN_SMALL_BUTTON_SIDE) / 2),
-        CHOSEN_SMALL_BUTTON_Y_MARGIN,
-        CHOSEN_SMALL_BUTTON_SIDE,
-        CHOSEN_SMALL_BUTTON_SIDE,
-        chosen_color
-    )
-
-    # Small left button
-    SMALL_BUTTON_SIDE = 50
-    SMALL_BUTTON_Y_MARGIN = round(
-        (SCREEN_HEIGHT - SMALL_BUTTON_SIDE) / 2
-    )
-    fill_rect(
-        round((BIG_BUTTON_X_MARGIN - SMALL_BUTTON_SIDE) / 2),
-        SMALL_BUTTON_Y_MARGIN,
-        SMALL_BUTTON_SIDE,
-        SMALL_BUTTON_SIDE,
-        GREEN
-    )
-
-    # Icon inside the left button
-    CUBE_ICON_SIDE = 30
-    CUBE_ICON_X_MARGIN = round(
-        (BIG_BUTTON_X_MARGIN - CUBE_ICON_SIDE) / 2
-    )
-    CUBE_ICON_Y_MARGIN = round(
-        (SCREEN_HEIGHT - CUBE_ICON_SIDE) / 2
-    )
-    fill_rect(
-        CUBE_ICON_X_MARGIN,
-        CUBE_ICON_Y_MARGIN,
-        CUBE_ICON_SIDE,
-        CUBE_ICON_SIDE,
-        YELLOW
-    )
-
-    # Small right button if chosen
-    if menu_button == 3:
-        chosen_color = WHITE
-    else:
-        chosen_color = MAIN_MENU_COLOR
-
-    CHOSEN_RIGHT_SMALL_BUTTON_X_MARGIN = round(
-        (BIG_BUTTON_X_MARGIN - CHOSEN_SMALL_BUTTON_SIDE) / 2
-        + BIG_BUTTON_SIDE + BIG_BUTTON_X_MARGIN
-    )
-
-    fill_rect(
-        CHOSEN_RIGHT_SMALL_BUTTON_X_MARGIN,
-        CHOSEN_SMALL_BUTTON_Y_MARGIN,
-        CHOSEN_SMALL_BUTTON_SIDE,
-        CHOSEN_SMALL_BUTTON_SIDE,
-        chosen_color
-    )
-
-    # Small right button
-    RIGHT_SMALL_BUTTON_X_MARGIN = round(
-        (BIG_BUTTON_X_MARGIN - SMALL_BUTTON_SIDE) / 2
-        + BIG_BUTTON_SIDE + BIG_BUTTON_X_MARGIN
-    )
-
-    fill_rect(
-        RIGHT_SMALL_BUTTON_X_MARGIN,
-        SMALL_BUTTON_Y_MARGIN,
-        SMALL_BUTTON_SIDE,
-        SMALL_BUTTON_SIDE,
-        GREEN
-    )
-
-    # Platformer controls button on the small right button
-
-    CONTROLS_MARGIN = 5
-    CONTROLS_X = RIGHT_SMALL_BUTTON_X_MARGIN + CONTROLS_MARGIN
-    CONTROLS_Y = SMALL_BUTTON_Y_MARGIN + CONTROLS_MARGIN
-    CONTROLS_SIDE = SMALL_BUTTON_SIDE - (CONTROLS_MARGIN * 2)
-    CONTROL_MAP_Y = [1, 2, 3, 0, 3, 2, 1]  # Height of every column of the pixel art
-    CONTROLS_PIXELS_X = len(CONTROL_MAP_Y)
-    CONTROLS_MAX_PIXELS_Y = max(CONTROL_MAP_Y)
-    CONTROLS_PIXEL_SIZE_Y = CONTROLS_SIDE / CONTROLS_MAX_PIXELS_Y
-    CONTROLS_PIXEL_SIZE_X = CONTROLS_SIDE / CONTROLS_PIXELS_X
-
-    for i in range(CONTROLS_PIXELS_X):
-        current_height = CONTROLS_PIXEL_SIZE_Y * CONTROL_MAP_Y[i]
-        fill_rect(
-            round(CONTROLS_X + CONTROLS_PIXEL_SIZE_X * i),
-            round(CONTROLS_Y + ((CONTROLS_SIDE - current_height) / 2)),
-            round(CONTROLS_PIXEL_SIZE_X),
-            round(current_height),
-            YELLOW
-        )
+    """Buttons, icons and text, drawn once when entering the menu"""
+    for x, y, w, h in MAIN_MENU_BUTTONS:
+        fill_rect(x, y, w, h, GREEN)
+    for x, y, w, h in MAIN_MENU_ICONS:
+        fill_rect(x, y, w, h, YELLOW)
 
     # Text
 
@@ -569,34 +1248,54 @@ def draw_main_menu():
     draw_centered_string("Up/OK=Jump | Shift=Restart", 170, WHITE, MAIN_MENU_COLOR)
     draw_centered_string("OK/EXE=Choose | Backspace=Exit", 190, WHITE, MAIN_MENU_COLOR)
 
+def draw_main_menu_selection(previous):
+    """Frames the chosen button, erasing the frame of the previous one"""
+    if previous is not None:
+        for x, y, w, h in MAIN_MENU_FRAMES[previous - 1]:
+            fill_rect(x, y, w, h, MAIN_MENU_COLOR)
+    for x, y, w, h in MAIN_MENU_FRAMES[menu_button - 1]:
+        fill_rect(x, y, w, h, WHITE)
+
 
 def enter_browse_levels_menu():
-    global menu, menu_button, max_menu_buttons
+    global menu, menu_button, max_menu_buttons, level_menu_color
+    stop_replay()
+    if PRINT_TELEMETRY and menu in ("level", "endscreen"):
+        print("Telemetry: " + export_telemetry())
     menu_button = current_level + 1
     max_menu_buttons = len(levels)
     menu = "browse_levels"
+    level_menu_color = None
     draw_level_menu()
 
 def draw_level_menu():
+    """Everything the menu shows depends on the level chosen, but its colors
+    often stay the same: then only the lines of text and the progress bar are
+    repainted"""
+    global level_menu_color
     completed_color = DARK_GREEN
     bg_color = levels[menu_button - 1][3]
     blocks_color = levels[menu_button - 1][4]
-    best = levels[menu_button - 1][6]
+    best = levels[menu_button - 1][6] / 100  # Stored in hundredths of a percent
+
+    if blocks_color != level_menu_color:
+        fill_screen(blocks_color)
+        draw_string("<", ARROW_MARGIN, PROGRESS_Y, WHITE, blocks_color)
+        draw_string(">", SCREEN_WIDTH - ARROW_MARGIN - CHARECTER_WIDTH, PROGRESS_Y, WHITE, blocks_color)
+        level_menu_color = blocks_color
+    else:
+        for y in LEVEL_MENU_LINES:
+            fill_rect(0, y, SCREEN_WIDTH, CHARACTER_HEIGHT, blocks_color)
 
-    fill_screen(blocks_color)
     draw_centered_string(levels[menu_button - 1][5], 40, WHITE, blocks_color)
     draw_centered_string("by " + str(levels[menu_button - 1][8]), 70, bg_color, blocks_color)
     draw_centered_string("Attempts: " + str(levels[menu_button - 1][7]), 150, bg_color, blocks_color)
 
     # Progressbar
-    MARGIN = 30
-    Y_POSITION = 110
+    fill_rect(PROGRESS_MARGIN, PROGRESS_Y, PROGRESS_LENGTH, CHARACTER_HEIGHT + 2, bg_color)
 
-    LENGTH = SCREEN_WIDTH - (MARGIN * 2)
-    fill_rect(MARGIN, Y_POSITION, LENGTH, CHARACTER_HEIGHT + 2, bg_color)
-
-    COMPLETED_LENGTH = round(LENGTH / 100 * best)
-    fill_rect(MARGIN, Y_POSITION, COMPLETED_LENGTH, CHARACTER_HEIGHT + 2, completed_color)
+    COMPLETED_LENGTH = round(PROGRESS_LENGTH / 100 * best)
+    fill_rect(PROGRESS_MARGIN, PROGRESS_Y, COMPLETED_LENGTH, CHARACTER_HEIGHT + 2, completed_color)
 
     if best > 50:
         bg_text_color = completed_color
@@ -605,11 +1304,7 @@ def draw_level_menu():
         bg_text_color = bg_color
         letters_color = blocks_color
 
-    LITTLE_MARGIN = 10
-    draw_string("<", LITTLE_MARGIN, Y_POSITION, WHITE, blocks_color)
-    draw_string(">", SCREEN_WIDTH - LITTLE_MARGIN - CHARECTER_WIDTH, Y_POSITION, WHITE, blocks_color)
-
-    draw_centered_string(str(round(best)) + "%", Y_POSITION, letters_color, bg_text_color)
+    draw_centered_string(str(round(best)) + "%", PROGRESS_Y, letters_color, bg_text_color)
 
 
 def enter_garage_menu():
@@ -617,289 +1312,535 @@ def enter_garage_menu():
     menu_button = 1
     max_menu_buttons = len(colors)
     menu = "garage"
+    if color_boxes is None:
+        lay_out_garage()
     draw_garage_menu()
+    draw_garage_selection(None)
 
 def draw_garage_menu():
-    global player_color
+    """Text, player and color boxes, drawn once when entering the menu"""
     fill_screen(GARAGE_MENU_COLOR)
     draw_centered_string("You:", 20, WHITE, GARAGE_MENU_COLOR)
     draw_centered_string("Choose your color:", 110, WHITE, GARAGE_MENU_COLOR)
-    if not colors[menu_button - 1][1]:
-        draw_centered_string(colors[menu_button - 1][3], 180, WHITE, GARAGE_MENU_COLOR)
-        draw_centered_string("to get this color", 200, WHITE, GARAGE_MENU_COLOR)
-
-    CUBE_SIDE = 40
-    CUBE_X_MARGIN = round((SCREEN_WIDTH - CUBE_SIDE) / 2)
-    fill_rect(CUBE_X_MARGIN, 50, CUBE_SIDE, CUBE_SIDE, player_color)
-
-    COLORS_COUNT = len(colors)
-    COLOR_SIDE = 30
-    X_MARGIN = 20
-    X_SPACE = SCREEN_WIDTH - (X_MARGIN * 2) - COLOR_SIDE
-    Y_MARGIN = 50
-
-
-    # Color box when chosen
+    draw_garage_cube()
+
+    for i in range(len(colors)):
+        x, y, w, h = color_boxes[i]
+        fill_rect(x, y, w, h, colors[i][2])
+
+def draw_garage_cube():
+    x, y, w, h = GARAGE_CUBE
+    fill_rect(x, y, w, h, player_color)
+
+def draw_garage_selection(previous):
+    """Frames the chosen color, white if it is unlocked, and tells how to
+    unlock it otherwise. The frame and text of the previous color are erased."""
+    chosen = menu_button - 1
+    boxes = color_frame_overlaps[chosen]
+
+    if previous is not None:
+        for x, y, w, h in color_frames[previous - 1]:
+            fill_rect(x, y, w, h, GARAGE_MENU_COLOR)
+        boxes += color_frame_overlaps[previous - 1]
+        if not colors[previous - 1][1]:
+            for y in GARAGE_UNLOCK_LINES:
+                fill_rect(0, y, SCREEN_WIDTH, CHARACTER_HEIGHT, GARAGE_MENU_COLOR)
+
+    frame_color = WHITE if colors[chosen][1] else GREY
+    for x, y, w, h in color_frames[chosen]:
+        fill_rect(x, y, w, h, frame_color)
+    for i in boxes:  # Frames are under the other boxes
+        x, y, w, h = color_boxes[i]
+        fill_rect(x, y, w, h, colors[i][2])
+
+    if not colors[chosen][1]:
+        unlock = colors[chosen][3]
+        if not isinstance(unlock, str):
+            unlock = "Complete \"" + levels[unlock][5] + "\""
+        draw_centered_string(unlock, GARAGE_UNLOCK_LINES[0], WHITE, GARAGE_MENU_COLOR)
+        draw_centered_string("to get this color", GARAGE_UNLOCK_LINES[1], WHITE, GARAGE_MENU_COLOR)
+
+
+# Scheduling
+# Frames start at deadlines TICK apart, the loop sleeps until the next one.
+# Idle menus wake up less often, and a running timer (the respawn delay) is
+# slept through in one go.
+# In a level, physics ticks have deadlines of their own, TICK apart: a frame
+# plays the ticks due, then draws the level once. When drawing falls behind,
+# up to MAX_FRAME_TICKS ticks are played per frame so the game keeps its
+# speed, and frames can be drawn more often than ticks are played.
+
+# Objects are drawn from 20 pixels before the screen: what scrolled off it is
+# still erased after up to 3 ticks
+MAX_FRAME_TICKS = 3
+RENDER_TICK = TICK  # Time between frames in a level, emulators can draw more
+if emulated:
+    try:
+        from emulator import frame_rate
+        RENDER_TICK = 1 / frame_rate
+    except:
+        pass
+
+next_frame = 0  # When the current frame started, by monotonic()
+next_tick = 0  # When the next physics tick is due
+timer_end = None  # When the running timer ends, None if there is none
+
+def start_timer(seconds: float):
+    global timer_end
+    if unthrottled:  # Nothing is waited for
+        seconds = 0
+    timer_end = monotonic() + seconds
+
+def stop_timer():
+    global timer_end
+    timer_end = None
+
+def timer_done():
+    return timer_end is not None and monotonic() >= timer_end
+
+def frame_period():
+    """Time until the next frame should start"""
+    if unthrottled and menu == "level":
+        return 0
+    if timer_end is not None:
+        return max(timer_end - next_frame, 0)
+    if menu == "level":
+        return RENDER_TICK
+    if if_clicked() or keydown(KEY_UP):
+        return TICK
+    return IDLE_TICK
+
+def wait_next_frame():
+    """Sleeps until the next frame is due"""
+    global next_frame
+    next_frame += frame_period()
+    now = monotonic()
+    if next_frame > now:
+        sleep(next_frame - now)
+    else:  # Running late, start from now instead of catching up
+        next_frame = now
+
+def start_ticks():
+    """The first tick of an attempt is due with the next frame: the current
+    one has drawn the attempt's start"""
+    global next_tick
+    next_tick = next_frame + TICK
+
+def ticks_due():
+    """Ticks to play in the current frame. Lag of more than MAX_FRAME_TICKS
+    is dropped: the game only slows down when that many are not enough."""
+    global next_tick
+    if unthrottled:
+        return 1
+
+    ticks = 0
+    # Within a thousandth of a tick, so that float errors delay no tick
+    while next_tick - next_frame < TICK / 1000 and ticks < MAX_FRAME_TICKS:
+        next_tick += TICK
+        ticks += 1
+    if next_tick - next_frame < TICK / 1000:
+        next_tick = next_frame + TICK
+    return ticks
+
+def tick_scroll():
+    """Pixels the level scrolls from the last tick played to the current
+    frame, drawn between ticks"""
+    if unthrottled:
+        return 0
+    return max(int(speed * (next_frame + TICK - next_tick) / TICK), 0)
+
+
+# Profiling
+# With PROFILING on, the functions of each part of a tick are wrapped at
+# startup to time them and to count the drawing calls. The frames played in a
+# level are added up and printed when the level is exited. With PROFILING off
+# nothing is wrapped and the game runs as is.
+
+PROFILING = False
+PROFILE_OVERLAY = False  # Also show each frame's time and fill_rect calls
+
+PROFILE_SECTIONS = ("physics", "collision", "stream", "draw", "hud")
+PROFILE_COUNTERS = ("ticks", "fill_rect", "draw_string")
+PROFILE_BUCKET = 4  # Milliseconds per frame time histogram bucket
+PROFILE_BUCKETS = 16  # The last bucket also counts slower frames
+
+profile_times = [0] * len(PROFILE_SECTIONS)  # Seconds of the current frame
+profile_calls = [0] * len(PROFILE_COUNTERS)  # Calls of the current frame
+profile_children = []  # Time spent in the sections called by the running ones
+profile_frames = 0
+profile_overruns = 0  # Frames longer than TICK
+profile_section_totals = [0] * len(PROFILE_SECTIONS)
+profile_call_totals = [0] * len(PROFILE_COUNTERS)
+profile_call_max = [0] * len(PROFILE_COUNTERS)
+profile_histogram = [0] * PROFILE_BUCKETS
+profile_draw_string = draw_string  # Not counted, for the overlay
+
+def profiled(section: int, function):
+    """Adds the time spent in function, minus the other sections it calls"""
+    def timed(*args):
+        profile_children.append(0)
+        start = monotonic()
+        result = function(*args)
+        elapsed = monotonic() - start
+        profile_times[section] += elapsed - profile_children.pop()
+        if profile_children:
+            profile_children[-1] += elapsed
+        return result
+    return timed
+
+def counted(counter: int, function):
+    def count(*args):
+        profile_calls[counter] += 1
+        return function(*args)
+    return count
+
+def install_profiler():
+    global step, find_contacts, check_collision, check_pad_collision
+    global is_supported, is_landing
+    global stream_level, draw_level, move_player, draw_hud_labels, draw_percentage
+    global fill_rect, draw_string
+
+    step = counted(0, profiled(0, step))
+    find_contacts = profiled(1, find_contacts)
+    check_collision = profiled(1, check_collision)
+    check_pad_collision = profiled(1, check_pad_collision)
+    is_supported = profiled(1, is_supported)
+    is_landing = profiled(1, is_landing)
+    stream_level = profiled(2, stream_level)
+    draw_level = profiled(3, draw_level)
+    move_player = profiled(3, move_player)
+    draw_hud_labels = profiled(4, draw_hud_labels)
+    draw_percentage = profiled(4, draw_percentage)
+    fill_rect = counted(1, fill_rect)
+    draw_string = counted(2, draw_string)
+
+def end_profile_frame(elapsed: float):
+    """Adds up the frame if it played a tick, prints the profile once the
+    level is exited"""
+    global profile_frames, profile_overruns
+    if profile_calls[0]:
+        profile_frames += 1
+        if elapsed > TICK:
+            profile_overruns += 1
+        profile_histogram[min(int(elapsed * 1000) // PROFILE_BUCKET, PROFILE_BUCKETS - 1)] += 1
+
+        for i in range(len(PROFILE_SECTIONS)):
+            profile_section_totals[i] += profile_times[i]
+        for i in range(len(PROFILE_COUNTERS)):
+            profile_call_totals[i] += profile_calls[i]
+            profile_call_max[i] = max(profile_call_max[i], profile_calls[i])
+
+        if PROFILE_OVERLAY:
+            profile_draw_string(
+                "%2dms %3d rects" % (int(elapsed * 1000), profile_calls[1]),
+                0, SCREEN_HEIGHT - CHARACTER_HEIGHT, WHITE, BLACK
+            )
 
-    CHOSEN_MARGIN = 5
+    for i in range(len(PROFILE_SECTIONS)):
+        profile_times[i] = 0
+    for i in range(len(PROFILE_COUNTERS)):
+        profile_calls[i] = 0
+
+    if menu != "level" and profile_frames:
+        print(profile_report())
+        reset_profile()
+
+def profile_report():
+    """Averages per frame of the frames added up since the last reset"""
+    frames = max(profile_frames, 1)
+    lines = [
+        "%s: %d frames, %d ticks, %d over %dms" % (
+            levels[current_level][5], profile_frames, profile_call_totals[0],
+            profile_overruns, int(TICK * 1000)
+        )
+    ]
+    for i in range(len(PROFILE_SECTIONS)):
+        lines.append("  %-11s %6.2f ms" % (PROFILE_SECTIONS[i], profile_section_totals[i] * 1000 / frames))
+    for i in range(1, len(PROFILE_COUNTERS)):
+        lines.append(
+            "  %-11s %6.1f, %d max" %
+            (PROFILE_COUNTERS[i], profile_call_totals[i] / frames, profile_call_max[i])
+        )
 
-    for i in range(COLORS_COUNT):
-        if i + 1 == menu_button:
-            fill_rect(
-                round(X_MARGIN + (X_SPACE / (COLORS_COUNT - 1) * i)) - CHOSEN_MARGIN,
-                SCREEN_HEIGHT - Y_MARGIN - COLOR_SIDE - CHOSEN_MARGIN,
-                COLOR_SIDE + CHOSEN_MARGIN * 2,
-                COLOR_SIDE + CHOSEN_MARGIN * 2,
-                WHITE if colors[menu_button - 1][1] else GREY
-            )
+    buckets = []
+    for i in range(PROFILE_BUCKETS):
+        if profile_histogram[i]:
+            low = i * PROFILE_BUCKET
+            high = "+" if i == PROFILE_BUCKETS - 1 else "-%d" % (low + PROFILE_BUCKET)
+            buckets.append("%d%s:%d" % (low, high, profile_histogram[i]))
+    lines.append("  frame ms    " + " ".join(buckets))
+    return "\n".join(lines)
+
+def reset_profile():
+    global profile_frames, profile_overruns
+    profile_frames = 0
+    profile_overruns = 0
+    for totals in (profile_section_totals, profile_call_totals, profile_call_max, profile_histogram):
+        for i in range(len(totals)):
+            totals[i] = 0
+
+
+# Telemetry
+# Each level played gets a record of fixed size, made on its first attempt
+# and kept while the script runs: the deaths and the late frames (longer than
+# RENDER_TICK) in each of TELEMETRY_BINS parts of the level's length, then
+# totals. export_telemetry() packs the records of the levels played into one
+# string, in the format of packed levels, that tools/telemetry.py reads.
+
+TELEMETRY = True
+PRINT_TELEMETRY = False  # Print the export when leaving a level
+
+TELEMETRY_BINS = 32
+# Totals: attempts, deaths, finishes, ticks played by the attempts that died
+# or finished, longest of them, frames, late frames, frame time in ms,
+# slowest frame in ms
+ATTEMPTS = 2 * TELEMETRY_BINS
+DEATHS = ATTEMPTS + 1
+FINISHES = ATTEMPTS + 2
+TICKS_PLAYED = ATTEMPTS + 3
+LONGEST_TICKS = ATTEMPTS + 4
+FRAMES = ATTEMPTS + 5
+LATE_FRAMES = ATTEMPTS + 6
+FRAME_MS = ATTEMPTS + 7
+SLOWEST_FRAME_MS = ATTEMPTS + 8
+# Digits of the level number, the bins and the totals in an export
+TELEMETRY_FIELDS = (2,) + (2,) * (2 * TELEMETRY_BINS) + (3, 3, 3, 4, 3, 4, 3, 5, 2)
+
+telemetry = {}  # Level number: record
+
+def telemetry_bin(map_offset_x: int):
+    """Part of the current level the player is in"""
+    end = levels[current_level][2] * 10
+    return min(max((player_x - map_offset_x) * TELEMETRY_BINS // end, 0), TELEMETRY_BINS - 1)
+
+def start_telemetry():
+    record = telemetry.get(current_level)
+    if record is None:
+        record = telemetry[current_level] = [0] * (len(TELEMETRY_FIELDS) - 1)
+    record[ATTEMPTS] += 1
+
+def end_telemetry(events: int):
+    """Adds up an attempt that died or finished"""
+    record = telemetry[current_level]
+    if events & DIED:
+        record[DEATHS] += 1
+        record[telemetry_bin(run.map_offset_x)] += 1
+    else:
+        record[FINISHES] += 1
+    record[TICKS_PLAYED] += run.ticks
+    record[LONGEST_TICKS] = max(record[LONGEST_TICKS], run.ticks)
+
+def telemetry_frame(elapsed: float):
+    """Adds up a frame drawn in the current level"""
+    record = telemetry[current_level]
+    ms = int(elapsed * 1000)
+    record[FRAMES] += 1
+    record[FRAME_MS] += ms
+    record[SLOWEST_FRAME_MS] = max(record[SLOWEST_FRAME_MS], ms)
+    if elapsed > RENDER_TICK:
+        record[LATE_FRAMES] += 1
+        record[TELEMETRY_BINS + telemetry_bin(map_offset_x)] += 1
+
+def export_telemetry():
+    return "".join(
+        pack_record([level] + telemetry[level], TELEMETRY_FIELDS)
+        for level in sorted(telemetry)
+    )
 
 
-    # Regular color boxes
+def main():
+    global menu_button, clicked, current_level
+    global player_color, next_frame
 
-    for i in range(COLORS_COUNT):
-        fill_rect(
-            round(X_MARGIN + (X_SPACE / (COLORS_COUNT - 1) * i)),
-            SCREEN_HEIGHT - Y_MARGIN - COLOR_SIDE,
-            COLOR_SIDE, COLOR_SIDE, colors[i][2]
-        )
+    next_frame = monotonic()
+    if REPLAY:
+        start_replay(REPLAY[0] - 1, REPLAY[1], UNTHROTTLED)
+    else:
+        enter_main_menu()
+    if STARTUP_TIMING:
+        print("First frame after %d ms" % ((monotonic() - startup_time) * 1000))
 
+    while True:  # Game loop
+        start = monotonic()
 
-enter_main_menu()
+        if menu == "level" and timer_end is None:
+            jump, events = play_frame(ticks_due())
+            if TELEMETRY:
+                telemetry_frame(monotonic() - start)
 
+            if not jump:
+                clicked = False
 
-while True:  # Game loop
-    start = monotonic()
 
-    if menu == "level" and not start_wait:
-        # Physics
+            if keydown(KEY_SHIFT) and not clicked:  # Restart an attempt
+                respawn()
+                events = 0
+                clicked = True
 
-        if not is_jumping:
-            for i in range(len(levels[current_level][0])):
-                if (
-                    player_y + 20 == levels[current_level][0][i][1] * 32
-                    and levels[current_level][0][i][0] * 10 + map_offset_x -19
-                    <= 50 <=
-                    levels[current_level][0][i][2] * 10 + levels[current_level][0][i][0] * 10 + map_offset_x
-                ):
-                    can_jump = True
-                    is_falling = False
-                    break
-                else:
-                    can_jump = False
-                    is_falling = True
+            elif not if_clicked():
+                clicked = False
 
-            if is_falling == True:
-                draw_player(bg_color)
-                player_y += 16
 
-            if check_pad_collision():
-                took_pad = True
-                jump_velocity *= 2
+            if keydown(KEY_BACKSPACE):  # Player exits
+                enter_browse_levels_menu()
+                clicked = True
 
-            if (
-                (keydown(KEY_OK) and can_jump == True) or
-                (keydown(KEY_UP) and can_jump == True)
-            ) or check_pad_collision():
-                draw_player(bg_color)
-                is_jumping = True
-                player_y -= int(jump_velocity)
-                jump_velocity = jump_velocity / 2
-
-        elif can_jump:
-            draw_player(bg_color)
-
-            for i in range(len(levels[current_level][0])):
-                if player_y + 20 != levels[current_level][0][i][1] * 32:
-                    is_jumping = True
-                elif (
-                    levels[current_level][0][i][0] * 10 + map_offset_x-19
-                    < 50
-                    < levels[current_level][0][i][0] * 10 + map_offset_x + levels[current_level][0][i][2] * 10 + 20
-                ):
-                    is_jumping = False
-                    jump_velocity = 32
-                    break
 
-            if is_jumping:
-                player_y -= int(jump_velocity)
-                if jump_velocity > 2:
-                    jump_velocity = jump_velocity / 2
-                elif jump_velocity == 2:
-                    jump_velocity = 0
-                elif jump_velocity == 0:
-                    air_ticks += 1
-
-                    if air_ticks == 4:
-                        air_ticks = 0
-                        jump_velocity = -2
-                elif jump_velocity <= (-2) and jump_velocity > (-32):
-                    jump_velocity=jump_velocity*2
-                else:
-                    is_jumping  = False
-                    jump_velocity = 32
-                    can_jump = True
-            else:
-                is_jumping  = False
-                jump_velocity = 32
+            # Player Dies
 
-        if not (keydown(KEY_OK) or keydown(KEY_UP)):
-            clicked = False
+            elif events & DIED:
+                draw_player(RED)
+                if RECORD_ATTEMPTS:
+                    print_attempt("died", run.ticks)
+                if TELEMETRY:
+                    end_telemetry(events)
 
+                if levels[current_level][6] < percentage:  # New best
+                    levels[current_level][6] = percentage
+                    draw_centered_string(percentage_label + "%", 80, WHITE, bg_color)
+                    draw_centered_string("NEW BEST!", 100, WHITE, bg_color)
 
-        # Drawing
+                start_timer(RESPAWN_TIME)
 
-        draw_player(player_color)
 
-        map_offset_x -= speed
-        draw_level()
+            # Endscreen
 
+            elif events & FINISHED:
+                draw_player(bg_color)
+                if RECORD_ATTEMPTS:
+                    print_attempt("finished", run.ticks)
+                if TELEMETRY:
+                    end_telemetry(events)
+                draw_level()
+                draw_centered_string("LEVEL COMPLETED!", 100, DARK_GREEN, bg_color)
+
+                levels[current_level][6] = 10000
+                for color in colors:
+                    if color[3] == current_level:
+                        color[1] = True
+
+                start_timer(RESPAWN_TIME)
+
+        elif menu == "level":
+            if timer_done():
+                stop_timer()
+                if player_x + PLAYER_WIDTH > levels[current_level][2] * 10 + map_offset_x:
+                    enter_endscreen()
+                else:  # Player died
+                    respawn()
+
+        elif menu == "endscreen":
 
-        if keydown(KEY_SHIFT) and not clicked:  # Restart an attempt
-            respawn()
-            clicked = True
+            if (
+                keydown(KEY_EXE) or
+                keydown(KEY_BACKSPACE) or
+                keydown(KEY_OK) or
+                keydown(KEY_SHIFT)
+            ):  # Waiting for a key to be pressed
+                clicked = True
+                if keydown(KEY_SHIFT):
+                    respawn()
+                else:
+                    enter_browse_levels_menu()
+
+        elif menu == "garage":
+            if keydown(KEY_RIGHT) and not clicked:
+                previous = menu_button
+                menu_button += 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = 1
+                clicked = True
+                draw_garage_selection(previous)
 
-        elif not if_clicked():
-            clicked = False
+            elif keydown(KEY_LEFT) and not clicked:
+                previous = menu_button
+                menu_button -= 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = max_menu_buttons
+                clicked = True
+                draw_garage_selection(previous)
 
+            if (keydown(KEY_EXE) or keydown(KEY_OK)) and not clicked:
+                if colors[menu_button - 1][1]:
+                    player_color = colors[menu_button - 1][2]
+                    draw_garage_cube()
 
-        if keydown(KEY_BACKSPACE):  # Player exits
-            enter_browse_levels_menu()
-            clicked = True
+            if keydown(KEY_BACKSPACE) and not clicked:
+                enter_main_menu()
 
+            if not if_clicked() and clicked:
+                clicked = False
 
-        # Player Dies
+        elif menu == "browse_levels":
+            if keydown(KEY_RIGHT) and not clicked:
+                menu_button += 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = 1
+                clicked = True
+                draw_level_menu()
 
-        elif player_y + PLAYER_HEIGHT > SCREEN_HEIGHT or check_collision():
-            draw_player(RED)
+            if keydown(KEY_LEFT) and not clicked:
+                menu_button -= 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = max_menu_buttons
+                clicked = True
+                draw_level_menu()
 
-            if levels[current_level][6] < percentage:  # New best
-                levels[current_level][6] = percentage
-                draw_centered_string(percentage_label + "%", 80, WHITE, bg_color)
-                draw_centered_string("NEW BEST!", 100, WHITE, bg_color)
+            if (keydown(KEY_EXE) or keydown(KEY_OK)) and not clicked:
+                current_level = menu_button - 1
+                respawn()
 
-            start_wait = monotonic()
+            if keydown(KEY_BACKSPACE) and not clicked:
+                enter_main_menu()
 
+            if not if_clicked() and clicked:
+                clicked = False
 
-        # Endscreen
+        elif menu == "main":
+            if keydown(KEY_RIGHT) and not clicked:
+                previous = menu_button
+                menu_button += 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = 1
+                clicked = True
+                draw_main_menu_selection(previous)
 
-        elif player_x + PLAYER_WIDTH > levels[current_level][2] * 10 + map_offset_x:
-            draw_player(bg_color)
-            draw_level()
-            draw_centered_string("LEVEL COMPLETED!", 100, DARK_GREEN, bg_color)
+            elif keydown(KEY_LEFT) and not clicked :
+                previous = menu_button
+                menu_button -= 1
+                if menu_button > max_menu_buttons or menu_button < 1:
+                    menu_button = max_menu_buttons
+                clicked = True
+                draw_main_menu_selection(previous)
 
-            levels[current_level][6] = 100.0
-            colors[current_level + 1][1] = True
+            elif (not keydown(KEY_RIGHT)) and (not keydown(KEY_LEFT)) and clicked:
+                clicked = False
 
-            start_wait = monotonic()
+            if keydown(KEY_EXE) or keydown(KEY_OK):
+                if menu_button == 1:
+                    enter_garage_menu()
+                    clicked = True
 
-    elif menu == "level":
-        current_wait = monotonic()
-        if current_wait - start_wait < RESPAWN_TIME:
-            continue
+                elif menu_button == 2:
+                    enter_browse_levels_menu()
+                    clicked = True
 
-        if player_x + PLAYER_WIDTH > levels[current_level][2] * 10 + map_offset_x:
-            enter_endscreen()
-        else:  # Player died
-            respawn()
+        if PROFILING:
+            end_profile_frame(monotonic() - start)
 
-    elif menu == "endscreen":
-        start_wait = None
+        if emulated:
+            update()
 
-        if (
-            keydown(KEY_EXE) or
-            keydown(KEY_BACKSPACE) or
-            keydown(KEY_OK) or
-            keydown(KEY_SHIFT)
-        ):  # Waiting for a key to be pressed
-            clicked = True
-            if keydown(KEY_SHIFT):
-                respawn()
-            else:
-                enter_browse_levels_menu()
+        wait_next_frame()
 
-    elif menu == "garage":
-        if keydown(KEY_RIGHT) and not clicked:
-            menu_button += 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = 1
-            clicked = True
-            draw_garage_menu()
-
-        elif keydown(KEY_LEFT) and not clicked:
-            menu_button -= 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = max_menu_buttons
-            clicked = True
-            draw_garage_menu()
-
-        if (keydown(KEY_EXE) or keydown(KEY_OK)) and not clicked:
-            if colors[menu_button - 1][1]:
-                player_color = colors[menu_button - 1][2]
-                draw_garage_menu()
-
-        if keydown(KEY_BACKSPACE) and not clicked:
-            enter_main_menu()
-
-        if not if_clicked() and clicked:
-            clicked = False
-
-    elif menu == "browse_levels":
-        if keydown(KEY_RIGHT) and not clicked:
-            menu_button += 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = 1
-            clicked = True
-            draw_level_menu()
-
-        if keydown(KEY_LEFT) and not clicked:
-            menu_button -= 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = max_menu_buttons
-            clicked = True
-            draw_level_menu()
-
-        if (keydown(KEY_EXE) or keydown(KEY_OK)) and not clicked:
-            current_level = menu_button - 1
-            respawn()
-
-        if keydown(KEY_BACKSPACE) and not clicked:
-            enter_main_menu()
-
-        if not if_clicked() and clicked:
-            clicked = False
-
-    elif menu == "main":
-        if keydown(KEY_RIGHT) and not clicked:
-            menu_button += 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = 1
-            clicked = True
-            draw_main_menu()
-
-        elif keydown(KEY_LEFT) and not clicked :
-            menu_button -= 1
-            if menu_button > max_menu_buttons or menu_button < 1:
-                menu_button = max_menu_buttons
-            clicked = True
-            draw_main_menu()
-
-        elif (not keydown(KEY_RIGHT)) and (not keydown(KEY_LEFT)) and clicked:
-            clicked = False
-
-        if keydown(KEY_EXE) or keydown(KEY_OK):
-            if menu_button == 1:
-                enter_garage_menu()
-                clicked = True
 
-            elif menu_button == 2:
-                enter_browse_levels_menu()
-                clicked = True
+if PROFILING:
+    install_profiler()
 
-    if emulated:
-        update()
+try:
+    from emulator import autostart  # Lets tools import the game without playing it
+except:
+    autostart = True
 
-    else:
-        end = monotonic()
-        wait = TICK - (end - start)
-        if wait > 0:
-            sleep(wait)
+if autostart:
+    main()
@@ -67,7 +67,7 @@ export async function registerRoutes(
       const data = await storage.getUserLevel(req.user.id);
       if (!data) return res.status(404).json({ message: "No levels found" });
       
-      const content = await storage.generatePython(data);
+      const content = await storage.generatePython(data, true);
       
       // Call external minify API using POST
       const minifyRes = await fetch("https://python-minify-api--gugguuies.replit.app/api/minify", {
@@ -8,6 +8,56 @@ import path from "path";
 
 const PostgresSessionStore = connectPg(session);
 
+// Packed levels: fixed width base 32 numbers, see unpack() in the game script
+const PACK_DIGITS = "0123456789:;<=>?@ABCDEFGHIJKLMNO";
+const PLATFORM_FIELDS = [3, 1, 3, 1];
+const SPIKE_FIELDS = [3, 1, 1];
+const PAD_FIELDS = [3, 1];
+
+// Returns null when a number does not fit its field
+function packObjects(objects: number[][], fields: number[]): string | null {
+  let packed = "";
+  for (const numbers of objects) {
+    for (let i = 0; i < fields.length; i++) {
+      let number = numbers[i];
+      if (!Number.isInteger(number) || number < 0 || number >= 32 ** fields[i]) return null;
+      let digits = "";
+      for (let d = 0; d < fields[i]; d++) {
+        digits = PACK_DIGITS[number % 32] + digits;
+        number = Math.floor(number / 32);
+      }
+      packed += digits;
+    }
+  }
+  return packed;
+}
+
+function unpackObjects(data: unknown, fields: number[]): number[][] {
+  if (typeof data !== "string") return (data as number[][]) || [];
+  const objects: number[][] = [];
+  let i = 0;
+  while (i < data.length) {
+    const numbers: number[] = [];
+    for (const digits of fields) {
+      let number = 0;
+      for (let d = 0; d < digits; d++) {
+        number = number * 32 + PACK_DIGITS.indexOf(data[i++]);
+      }
+      numbers.push(number);
+    }
+    objects.push(numbers);
+  }
+  return objects;
+}
+
+// Python literal for a list of objects, packed when asked and possible.
+// Packed objects are sorted by x so the game can stream them without sorting.
+function objectsLiteral(objects: number[][], fields: number[], packed: boolean): string {
+  const packedObjects = packed ? packObjects([...objects].sort((a, b) => a[0] - b[0]), fields) : null;
+  if (packedObjects !== null) return `"${packedObjects}"`;
+  return "[" + objects.map(o => `[${o.join(", ")}]`).join(", ") + "]";
+}
+
 // Helper to parse the Python file
 function parsePythonData(content: string): GameData {
   try {
@@ -53,8 +103,8 @@ function parsePythonData(content: string): GameData {
     
     const levels: Level[] = parsedRaw.map((lvl: any, index: number) => ({
       id: index,
-      blocks: (lvl[0] || []).map((b: any) => ({ x: b[0], y: b[1], w: b[2], h: b[3] })),
-      spikes: (lvl[1] || []).map((s: any) => {
+      blocks: unpackObjects(lvl[0], PLATFORM_FIELDS).map((b: any) => ({ x: b[0], y: b[1], w: b[2], h: b[3] })),
+      spikes: unpackObjects(lvl[1], SPIKE_FIELDS).map((s: any) => {
         let y = s[1];
         if (s[2] === 0) y -= 1; 
         return { x: s[0], y, orientation: s[2] };
@@ -66,7 +116,7 @@ function parsePythonData(content: string): GameData {
       completed: lvl[6] || 0,
       attempts: lvl[7] || 0,
       author: lvl[8] || "Unknown",
-      pads: (lvl[9] || []).map((p: any) => [p[0], p[1]])
+      pads: unpackObjects(lvl[9], PAD_FIELDS).map((p: any) => [p[0], p[1]])
     }));
 
     return { levels };
@@ -76,18 +126,18 @@ function parsePythonData(content: string): GameData {
   }
 }
 
-async function generatePythonContent(data: GameData): Promise<string> {
+async function generatePythonContent(data: GameData, packed = false): Promise<string> {
    const levelsStr = "[\n" + data.levels.map(lvl => {
-     const blocks = "[" + lvl.blocks.map(b => `[${b.x}, ${b.y}, ${b.w}, ${b.h}]`).join(", ") + "]";
-     const spikes = "[" + lvl.spikes.map(s => {
+     const blocks = objectsLiteral(lvl.blocks.map(b => [b.x, b.y, b.w, b.h]), PLATFORM_FIELDS, packed);
+     const spikes = objectsLiteral(lvl.spikes.map(s => {
        let y = s.y;
        if (s.orientation === 0) y += 1; 
        // On décale chaque spike de +1 vers la droite lors de l'exportation pour NumWorks
-       return `[${s.x + 1}, ${y}, ${s.orientation}]`;
-     }).join(", ") + "]";
+       return [s.x + 1, y, s.orientation];
+     }), SPIKE_FIELDS, packed);
      const bg = `(${lvl.bgColor.join(", ")})`;
      const ground = `(${lvl.groundColor.join(", ")})`;
-     const pads = "[" + (lvl.pads || []).map(p => `[${p[0]}, ${p[1]}]`).join(", ") + "]";
+     const pads = objectsLiteral((lvl.pads || []).map(p => [p[0], p[1]]), PAD_FIELDS, packed);
      return `    [  # ${lvl.name}\n        ${blocks},\n        ${spikes},\n        ${lvl.endX}, ${bg}, ${ground}, "${lvl.name}", ${lvl.completed}, ${lvl.attempts}, "${lvl.author}", ${pads}\n    ]`;
    }).join(",\n") + "\n]";
 
@@ -129,7 +179,7 @@ export interface IStorage {
   getUserLevel(userId: number): Promise<GameData | undefined>;
   updateUserLevel(userId: number, data: GameData): Promise<void>;
   parsePython(content: string): GameData;
-  generatePython(data: GameData): Promise<string>;
+  generatePython(data: GameData, packed?: boolean): Promise<string>;
 }
 
 export class DatabaseStorage implements IStorage {
@@ -182,8 +232,8 @@ export class DatabaseStorage implements IStorage {
     return parsePythonData(content);
   }
 
-  async generatePython(data: GameData): Promise<string> {
-    return await generatePythonContent(data);
+  async generatePython(data: GameData, packed = false): Promise<string> {
+    return await generatePythonContent(data, packed);
   }
 }
 
@@ -0,0 +1,320 @@
+"""Simulates many jump input sequences of one level at once, with NumPy.
+
+Every run of a level scrolls the same way, so what a run can touch at each
+tick only depends on its height. The level is first turned into one table per
+tick, using the script's own streaming and contacts: for each player_y, does
+a platform top carry the player, does it land on one, does it take a pad,
+does it die. Then every run is a lane of NumPy arrays (player_y, arc_tick,
+air_ticks, can_jump, is_jumping, is_falling) advanced tick by tick by the
+same state machine as `step()`. Lanes that die or finish are dropped from the
+arrays, so the work per tick follows the runs still going.
+
+    python tools/batch.py                        # 100k random sequences per level
+    python tools/batch.py --check                # tick by tick against step()
+    python tools/batch.py --script gd_gen.py --level 5 --lanes 1000000
+
+Random sequences hold jump or not for a few ticks at a time. `--check` also
+plays sequences through `step()`, half of them random and half the winning
+inputs of `verify.py` changed from a random tick on, and exits with status 1
+if any tick of any of them differs.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import verify
+from headless import GAME_SCRIPT, load_game, select_level
+
+SWITCH_CHANCE = 1 / 8  # Per tick, of a random sequence changing its jump bit
+BLOCK = 100000  # Random sequences simulated at a time, to bound memory
+
+
+class Tables:
+    """What a level does to a run at each tick, by player_y from y_min to
+    SCREEN_HEIGHT. Heights out of that range are clamped to it: above y_min
+    nothing can be touched, below the screen the run dies anyway."""
+
+    def __init__(self, game, level):
+        self.game = game
+        select_level(game, level)
+        game.restart_level()
+
+        # (top, left, right) support, and hit boxes as intervals of player_y
+        # the player overlaps them in (lo < player_y < hi), for every tick
+        supports, pads, deaths = [], [], []
+        finish_x = game.levels[level][2] * 10
+        run = game.Run()
+        while True:
+            map_offset_x = run.map_offset_x
+            game.stream_level(map_offset_x - game.speed)
+            contacts = game.find_contacts(run)
+            supports.append(game.ground_at(game.player_x - map_offset_x))
+            pads.append(self.pad_intervals(contacts, map_offset_x))
+            deaths.append(self.death_intervals(contacts, map_offset_x - game.speed))
+            if game.player_x + game.PLAYER_WIDTH > finish_x + map_offset_x - game.speed:
+                break
+            run.map_offset_x -= game.speed
+
+        self.ticks = len(supports)  # The level is finished at the last one
+        lows = [lo for intervals in pads + deaths for lo, _ in intervals]
+        lows += [top - game.PLAYER_HEIGHT - 1 for support in supports for top, _, _ in support]
+        self.y_min = min(lows + [0]) - 1
+        heights = game.SCREEN_HEIGHT - self.y_min + 1
+        y = np.arange(self.y_min, game.SCREEN_HEIGHT + 1)
+        feet = y + game.PLAYER_HEIGHT
+        x = game.player_x + game.speed * np.arange(self.ticks)
+
+        self.standing = np.zeros((self.ticks, heights), bool)
+        self.landing = np.zeros((self.ticks, heights), bool)
+        self.pad = np.zeros((self.ticks, heights), bool)
+        self.death = np.zeros((self.ticks, heights), bool)
+        for tick in range(self.ticks):
+            for top, left, right in supports[tick]:
+                if left <= x[tick] <= right:
+                    self.standing[tick] |= feet == top
+                if left < x[tick] < right + 20:
+                    self.landing[tick] |= feet == top
+            for lo, hi in pads[tick]:
+                self.pad[tick] |= (y > lo) & (y < hi)
+            for lo, hi in deaths[tick]:
+                self.death[tick] |= (y > lo) & (y < hi)
+        self.death[:, y + game.PLAYER_HEIGHT > game.SCREEN_HEIGHT] = True
+
+    def pad_intervals(self, contacts, map_offset_x):
+        """As check_pad_collision()"""
+        game = self.game
+        player_tile = (-map_offset_x + game.player_x) // 10
+        intervals = []
+        for x, y, _, _ in contacts[game.PADS]:
+            rx = x * 10 + map_offset_x
+            if (
+                player_tile - 2 <= x <= player_tile + 2 and
+                game.player_x + game.PLAYER_WIDTH > rx and game.player_x < rx + 10
+            ):
+                intervals.append((y * 32 - 16 - game.PLAYER_HEIGHT, y * 32 + 16))
+        return intervals
+
+    def death_intervals(self, contacts, map_offset_x):
+        """As check_collision(), once scrolled"""
+        game = self.game
+        player_tile = (-map_offset_x + game.player_x) // 10
+        first_tile, last_tile = player_tile - 2, player_tile + 2
+        intervals = []
+        for x, y, w, h, _, _ in contacts[game.PLATFORMS]:
+            rx = x * 10 + map_offset_x
+            if (
+                not (x > last_tile or x + w < first_tile) and
+                game.player_x + game.PLAYER_WIDTH > rx and game.player_x < rx + w * 10
+            ):
+                intervals.append((y * 32 - game.PLAYER_HEIGHT, y * 32 + h * 32))
+        for x, y, orientation, _, _ in contacts[game.SPIKES]:
+            rx = x * 10 + map_offset_x
+            if (
+                first_tile <= x <= last_tile and
+                game.player_x + game.PLAYER_WIDTH > rx and game.player_x < rx + 10
+            ):
+                top = y * 32 if orientation else y * 32 - 16
+                intervals.append((top - game.PLAYER_HEIGHT, top + 16))
+        return intervals
+
+
+class Lanes:
+    """Runs of a level as arrays, one element per run still going"""
+
+    def __init__(self, count, run):
+        self.ids = np.arange(count)
+        self.player_y = np.full(count, run.player_y, np.int32)
+        self.arc_tick = np.full(count, run.arc_tick, np.int32)
+        self.air_ticks = np.full(count, run.air_ticks, np.int32)
+        self.can_jump = np.full(count, run.can_jump)
+        self.is_jumping = np.full(count, run.is_jumping)
+        self.is_falling = np.full(count, run.is_falling)
+
+    def keep(self, kept):
+        for name in ("ids", "player_y", "arc_tick", "air_ticks", "can_jump", "is_jumping", "is_falling"):
+            setattr(self, name, getattr(self, name)[kept])
+
+
+def simulate(tables, jumps, on_tick=None):
+    """Plays every row of jumps, a (runs, ticks) array of jump bits.
+
+    Returns the events and ticks of the tick that ended each run, as
+    headless.play() does: (0, ticks given) for the runs still going once their
+    inputs run out. on_tick(tick, lanes, events) is called after every tick.
+    """
+    game = tables.game
+    arc = np.array(game.JUMP_ARC + (0,), np.int32)
+    arc_end = len(game.JUMP_ARC)
+    count, length = jumps.shape
+    lanes = Lanes(count, game.Run())
+    results = np.zeros(count, np.int32)
+    ticks = np.full(count, length, np.int32)
+
+    def advance_arc(mask):
+        lanes.player_y -= np.where(mask, arc[lanes.arc_tick], 0)
+        lanes.arc_tick += mask
+        hover = mask & (lanes.arc_tick == game.HOVER_START)
+        lanes.arc_tick += np.where(hover, lanes.air_ticks, 0)
+        lanes.air_ticks[hover] = 0
+
+    for tick in range(min(length, tables.ticks)):
+        if not len(lanes.ids):
+            break
+        jump = jumps[lanes.ids, tick]
+        y = np.clip(lanes.player_y, tables.y_min, game.SCREEN_HEIGHT) - tables.y_min
+        events = np.zeros(len(lanes.ids), np.int32)
+
+        grounded = ~lanes.is_jumping
+        supported = tables.standing[tick][y]
+        lanes.can_jump = np.where(grounded, supported, lanes.can_jump)
+        lanes.is_falling = np.where(grounded, ~supported, lanes.is_falling)
+        lanes.player_y += np.where(grounded & lanes.is_falling, game.FALL_SPEED, 0)
+
+        y = np.clip(lanes.player_y, tables.y_min, game.SCREEN_HEIGHT) - tables.y_min
+        pad = grounded & tables.pad[tick][y]
+        jumped = grounded & jump & lanes.can_jump
+        lanes.arc_tick[pad] = game.PAD_START
+        lanes.arc_tick[jumped & ~pad] = game.JUMP_START
+        started = jumped | pad
+        lanes.is_jumping |= started
+        advance_arc(started)
+        events[started] |= game.JUMPED
+        events[pad] |= game.TOOK_PAD
+
+        airborne = ~grounded & lanes.can_jump
+        landed = airborne & tables.landing[tick][y]
+        lanes.is_jumping[landed] = False
+        lanes.air_ticks = np.where(
+            landed,
+            np.where(
+                lanes.arc_tick >= game.HOVER_END, 0,
+                np.where(lanes.arc_tick >= game.HOVER_START, lanes.arc_tick - game.HOVER_START, lanes.air_ticks)
+            ),
+            lanes.air_ticks
+        )
+        lanes.arc_tick[landed] = 0
+        rising = airborne & ~landed
+        advance_arc(rising)
+        ended = rising & (lanes.arc_tick == arc_end)
+        lanes.is_jumping[ended] = False
+        lanes.arc_tick[ended] = 0
+
+        y = np.clip(lanes.player_y, tables.y_min, game.SCREEN_HEIGHT) - tables.y_min
+        died = tables.death[tick][y]
+        events[died] |= game.DIED
+        if tick == tables.ticks - 1:
+            events[~died] |= game.FINISHED
+
+        if on_tick:
+            on_tick(tick, lanes, events)
+        over = (events & (game.DIED | game.FINISHED)) != 0
+        if over.any():
+            results[lanes.ids[over]] = events[over]
+            ticks[lanes.ids[over]] = tick + 1
+            lanes.keep(~over)
+    return results, ticks
+
+
+def random_inputs(rng, count, length):
+    """Jump bits held for a few ticks at a time, SWITCH_CHANCE of changing each tick"""
+    switches = rng.random((count, length)) < SWITCH_CHANCE
+    switches[:, 0] = rng.random(count) < 0.5
+    return np.logical_xor.accumulate(switches, axis=1)
+
+
+def winning_variants(rng, game, level, count, length):
+    """The winning inputs verify.py finds, changed from a random tick on, so
+    that checked runs get through the whole level rather than die early"""
+    verify.game = game
+    inputs, _ = verify.solve(level)
+    jumps = random_inputs(rng, count, length)
+    if inputs is not None:
+        inputs = np.array(inputs[:length] + [False] * (length - len(inputs)))
+        for lane, start in enumerate(rng.integers(0, length + 1, count)):
+            jumps[lane, :start] = inputs[:start]
+    return jumps
+
+
+def check(tables, level, jumps):
+    """Plays the first rows of jumps through step(), returns the first tick
+    that differs as a message, or None"""
+    game = tables.game
+    count = len(jumps)
+    expected = []  # (run, tick) -> (key, events)
+    for lane in range(count):
+        select_level(game, level)
+        run = game.Run()
+        for tick, jump in enumerate(jumps[lane]):
+            events = game.step(run, bool(jump))
+            expected.append(((lane, tick), (run.key(), events)))
+            if events & (game.DIED | game.FINISHED):
+                break
+    expected = dict(expected)
+
+    found = {}
+
+    def record(tick, lanes, events):
+        for i, lane in enumerate(lanes.ids):
+            key = (
+                int(lanes.player_y[i]), int(lanes.arc_tick[i]), int(lanes.air_ticks[i]),
+                bool(lanes.can_jump[i]), bool(lanes.is_jumping[i]), bool(lanes.is_falling[i])
+            )
+            found[(int(lane), tick)] = (key, int(events[i]))
+
+    simulate(tables, jumps, record)
+    for place in sorted(set(expected) | set(found)):
+        if expected.get(place) != found.get(place):
+            lane, tick = place
+            return f"run {lane}, tick {tick + 1}: step() gives {expected.get(place)}, the batch {found.get(place)}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script to load")
+    parser.add_argument("--level", type=int, nargs="*", help="level numbers, starting at 1 (default: all)")
+    parser.add_argument("--lanes", type=int, default=100000, help="input sequences per level")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random sequences")
+    parser.add_argument("--check", type=int, nargs="?", const=300, default=0,
+                        help="sequences per level to also play through step() (default 300)")
+    args = parser.parse_args()
+
+    game = load_game(args.script)
+    rng = np.random.default_rng(args.seed)
+    failed = 0
+    for number in args.level or range(1, len(game.levels) + 1):
+        level = number - 1
+        tables = Tables(game, level)
+        finished = 0
+        played = 0
+        elapsed = 0
+        for first in range(0, args.lanes, BLOCK):
+            jumps = random_inputs(rng, min(BLOCK, args.lanes - first), tables.ticks)
+            start = time.perf_counter()
+            events, ticks = simulate(tables, jumps)
+            elapsed += time.perf_counter() - start
+            finished += np.count_nonzero(events & game.FINISHED)
+            played += ticks.sum()
+
+        print(
+            f"{number}. {game.levels[level][5]}: {finished}/{args.lanes} finished, "
+            f"{played / args.lanes:.0f} ticks on average, {played / elapsed / 1e6:.1f}M run ticks/s",
+            file=sys.stderr
+        )
+        if args.check:
+            jumps = np.vstack((jumps[:args.check // 2], winning_variants(rng, game, level, args.check // 2, tables.ticks)))
+            difference = check(tables, level, jumps)
+            if difference:
+                failed += 1
+                print(f"   differs from step() at {difference}", file=sys.stderr)
+            else:
+                print(f"   same as step() on {len(jumps)} sequences", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Benchmarks the game engine on a computer, with a counting screen backend.
+
+Each benchmark plays one attempt frame by frame through the script's own
+`play_frame()`, as its game loop does, fed by a replay played unthrottled (a
+tick per frame) and drawing to a stub `fill_rect`/`draw_string` that only
+counts calls. The levels of the script, such as the ones `levelgen.py` writes, are
+played with the winning trace `verify.py` finds, the synthetic levels (1k, 10k
+and 100k objects, all out of the player's reach) without jumping.
+
+Every benchmark is timed a few times, keeping the fastest run, then run once
+more under tracemalloc for how far each frame raises the traced memory above
+what it started with (memory allocated and freed within the frame only counts
+by its highest point), and the peak memory of loading and playing the level.
+Results are printed as JSON, to compare commits:
+
+    python tools/bench.py -o before.json
+    python tools/bench.py --baseline before.json   # with the change per metric
+    python tools/bench.py --script gd_gen.py --no-synthetic
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import verify
+from headless import GAME_SCRIPT, load_game
+from replay import encode
+
+SYNTHETIC_SIZES = (1000, 10000, 100000)
+SYNTHETIC_TICKS = 2000  # Ticks played in a synthetic level
+
+
+def synthetic_level(objects):
+    """A level of a ground platform and objects - 1 platforms, spikes and pads
+    out of the player's reach, about one per tile column"""
+    rng = random.Random(objects)
+    length = objects
+    platforms = [[0, 6, length + 10, 1]]
+    spikes = []
+    pads = []
+    for i in range(objects - 1):
+        x = rng.randrange(8, length)
+        if i % 3 == 0:
+            platforms.append([x, rng.randrange(1, 4), rng.randrange(1, 6), 1])
+        elif i % 3 == 1:
+            spikes.append([x, 3, 1])  # Upside down, hanging above the player
+        else:
+            pads.append([x, rng.randrange(0, 3)])
+    name = f"Synthetic {objects}"
+    return [platforms, spikes, length + 10, (0, 120, 200), (0, 40, 80), name, 0, 0, "bench", pads]
+
+
+def object_count(level):
+    return len(level[0]) + len(level[1]) + len(level[9])
+
+
+class Counter:
+    def __init__(self):
+        self.fill_rect = 0
+        self.draw_string = 0
+
+    def count_fill_rect(self, x, y, width, height, color):
+        self.fill_rect += 1
+
+    def count_draw_string(self, text, x, y, color=None, background=None):
+        self.draw_string += 1
+
+
+def play(game, level, inputs, traced=False):
+    """Loads a level and plays one attempt of it, returns the measures"""
+    counter = Counter()
+    game.fill_rect = counter.count_fill_rect
+    game.draw_string = counter.count_draw_string
+    game.loaded_level = None  # Load the level again
+    runs = encode(game, inputs)
+
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    game.start_replay(level, runs, True)
+    loaded = time.perf_counter()
+    counter.fill_rect = counter.draw_string = 0
+
+    frames = 0
+    peak_growth = 0
+    peak = tracemalloc.get_traced_memory()[1] if traced else 0  # Of loading
+    for _ in inputs:
+        if traced:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        _, events = game.play_frame(game.ticks_due())
+        frames += 1
+        if traced:
+            frame_peak = tracemalloc.get_traced_memory()[1]
+            peak_growth += frame_peak - before
+            peak = max(peak, frame_peak)
+        if events & (game.DIED | game.FINISHED):
+            break
+    end = time.perf_counter()
+    game.stop_replay()
+
+    measures = {
+        "frames": frames,
+        "load_ms": (loaded - start) * 1000,
+        "ticks_per_s": frames / (end - loaded),
+        "fill_rect_per_frame": counter.fill_rect / frames,
+        "draw_string_per_frame": counter.draw_string / frames,
+    }
+    if traced:
+        tracemalloc.stop()
+        measures["peak_bytes"] = peak
+        measures["peak_growth_bytes_per_frame"] = peak_growth / frames
+    return measures
+
+
+def benchmark(game, level, inputs, repeat):
+    measures = max((play(game, level, inputs) for _ in range(repeat)), key=lambda m: m["ticks_per_s"])
+    traced = play(game, level, inputs, traced=True)
+    measures["peak_growth_bytes_per_frame"] = traced["peak_growth_bytes_per_frame"]
+    measures["peak_bytes"] = traced["peak_bytes"]
+    return {"level": game.levels[level][5], "objects": object_count(game.levels[level]), **measures}
+
+
+def winning_inputs(game, level):
+    """Jump bits that complete a level, or no jumps if none do"""
+    verify.game = game
+    inputs, _ = verify.solve(level)
+    if inputs is None:
+        return [False] * (game.levels[level][2] * 10 // game.speed + 1)
+    return inputs
+
+
+def compare(results, baseline):
+    """Relative change of every metric from a previous run"""
+    previous = {result["level"]: result for result in baseline["results"]}
+    for result in results:
+        old = previous.get(result["level"])
+        if old is None:
+            continue
+        changes = []
+        for metric, value in result.items():
+            if isinstance(value, float) and old.get(metric):
+                changes.append(f"{metric} {(value / old[metric] - 1) * 100:+.1f}%")
+        print(f"{result['level']}: " + ", ".join(changes), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script to benchmark")
+    parser.add_argument("-o", "--output", type=Path, help="write the JSON results to a file")
+    parser.add_argument("--baseline", type=Path, help="previous JSON results to compare with")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--no-synthetic", action="store_true", help="only the built-in levels")
+    args = parser.parse_args()
+
+    game = load_game(args.script)
+    runs = [(level, winning_inputs(game, level)) for level in range(len(game.levels))]
+    if not args.no_synthetic:
+        for objects in SYNTHETIC_SIZES:
+            game.levels.append(synthetic_level(objects))
+            runs.append((len(game.levels) - 1, [False] * SYNTHETIC_TICKS))
+
+    results = []
+    for level, inputs in runs:
+        results.append(benchmark(game, level, inputs, args.repeat))
+        print(f"{results[-1]['level']}: {results[-1]['ticks_per_s']:.0f} ticks/s", file=sys.stderr)
+
+    report = json.dumps({"script": str(args.script), "python": platform.python_version(), "results": results}, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    else:
+        print(report)
+    if args.baseline:
+        compare(results, json.loads(args.baseline.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""A kandinsky screen for computers: the `emulator` module the game imports.
+
+The screen is a 320x222 NumPy RGB array. `fill_rect` is a slice assignment,
+`draw_string` draws a 5x7 bitmap font scaled into kandinsky's 10x18 character
+cells, and `sleep` advances a virtual clock instead of waiting, so the game
+runs headless as fast as it can draw while its own timing (30 ticks per
+second, respawn delay) stays the same. Levels can be drawn at a higher frame
+rate than the ticks with `--fps`. Frames can be saved as PNG images.
+
+Run from a shell, it plays the unchanged game script from its main menu:
+
+    python tools/emulator.py --frames 300 --png frames/ --every 30
+    python tools/emulator.py --keys 10:OK 20:OK --frames 600   # plays level 1
+
+Keys are KEY_ names without the prefix, held for KEY_FRAMES frames from the
+given frame, or for a range of frames with `30-90:UP`.
+"""
+
+import argparse
+import struct
+import sys
+import time
+import types
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+SCREEN_WIDTH = 320
+SCREEN_HEIGHT = 222
+CHARACTER_WIDTH = 10
+CHARACTER_HEIGHT = 18
+KEY_FRAMES = 3
+
+KEYS = ("OK", "EXE", "UP", "DOWN", "LEFT", "RIGHT", "BACKSPACE", "SHIFT")
+
+# 5x7 font, ASCII 32 to 126: five columns per character, lowest bit on top
+FONT = bytes.fromhex(
+    "0000000000" "00005f0000" "0007000700" "147f147f14" "242a7f2a12" "2313086462"
+    "3649562050" "0008070300" "001c224100" "0041221c00" "2a1c7f1c2a" "08083e0808"
+    "0080703000" "0808080808" "0000606000" "2010080402" "3e5149453e" "00427f4000"
+    "7249494946" "2141494d33" "1814127f10" "2745454539" "3c4a494931" "4121110907"
+    "3649494936" "464949291e" "0000140000" "0040340000" "0008142241" "1414141414"
+    "0041221408" "0201590906" "3e415d594e" "7c1211127c" "7f49494936" "3e41414122"
+    "7f4141413e" "7f49494941" "7f09090901" "3e41415173" "7f0808087f" "00417f4100"
+    "2040413f01" "7f08142241" "7f40404040" "7f021c027f" "7f0408107f" "3e4141413e"
+    "7f09090906" "3e4151215e" "7f09192946" "2649494932" "03017f0103" "3f4040403f"
+    "1f2040201f" "3f4038403f" "6314081463" "0304780403" "61594d4d43" "007f414141"
+    "0204081020" "004141417f" "0402010204" "4040404040" "0003070800" "2054547840"
+    "7f28444438" "3844444428" "384444287f" "3854545418" "00087e0902" "18a4a49c78"
+    "7f08040478" "00447d4000" "2040403d00" "7f10284400" "00417f4000" "7c04780478"
+    "7c08040478" "3844444438" "fc18242418" "18242418fc" "7c08040408" "4854545424"
+    "04043f4424" "3c4040207c" "1c2040201c" "3c4030403c" "4428102844" "4c9090907c"
+    "4464544c44" "0008364100" "0000770000" "0041360800" "0201020402"
+)
+
+screen = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), np.uint8)
+clock = 0.0  # Virtual time, in seconds
+frames = 0  # update() calls
+keys_down = set()
+autostart = True
+on_update = []  # Called with the frame number after every update()
+realtime = False  # Really wait in sleep(), with the real clock
+frame_rate = 30  # Frames per second the game draws in a level, ticks stay at 30
+
+
+def glyph(character):
+    """Foreground mask of a character cell, CHARACTER_HEIGHT x CHARACTER_WIDTH"""
+    code = ord(character) - 32
+    if not 0 <= code < len(FONT) // 5:
+        code = ord("?") - 32
+    columns = np.frombuffer(FONT[code * 5:code * 5 + 5], np.uint8)
+    bits = (columns[None, :] >> np.arange(8)[:, None]) & 1  # 8 rows x 5 columns
+    # Scaled to 8 columns by 16 rows, with a 1 pixel margin
+    scaled = bits[np.arange(16) // 2][:, np.arange(8) * 5 // 8]
+    cell = np.zeros((CHARACTER_HEIGHT, CHARACTER_WIDTH), bool)
+    cell[1:17, 1:9] = scaled
+    return cell
+
+
+GLYPHS = {chr(code): glyph(chr(code)) for code in range(32, 127)}
+text_masks = {}
+
+
+def text_mask(text):
+    mask = text_masks.get(text)
+    if mask is None:
+        cells = [GLYPHS.get(character) for character in text]
+        cells = [cell if cell is not None else glyph(character) for cell, character in zip(cells, text)]
+        mask = np.hstack(cells) if cells else np.zeros((CHARACTER_HEIGHT, 0), bool)
+        text_masks[text] = mask
+    return mask
+
+
+def clip(x, y, width, height):
+    """Screen slices of a rectangle, None if it is off screen"""
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + width, SCREEN_WIDTH), min(y + height, SCREEN_HEIGHT)
+    if left >= right or top >= bottom:
+        return None
+    return slice(top, bottom), slice(left, right)
+
+
+def fill_rect(x, y, width, height, color):
+    area = clip(x, y, width, height)
+    if area:
+        screen[area] = color
+
+
+def draw_string(text, x, y, color=(0, 0, 0), background=(255, 255, 255)):
+    mask = text_mask(text)
+    area = clip(x, y, mask.shape[1], CHARACTER_HEIGHT)
+    if area:
+        rows, columns = area
+        visible = mask[rows.start - y:rows.stop - y, columns.start - x:columns.stop - x]
+        region = screen[area]
+        region[:] = background
+        region[visible] = color
+
+
+def update():
+    global frames
+    frames += 1
+    for callback in on_update:
+        callback(frames)
+
+
+def sleep(seconds):
+    global clock
+    if realtime:
+        time.sleep(seconds)
+    else:
+        clock += seconds
+
+
+def monotonic():
+    return time.monotonic() if realtime else clock
+
+
+def keydown(key):
+    return key in keys_down
+
+
+def png(image=None):
+    """PNG file contents of the screen, or of an RGB array"""
+    image = screen if image is None else image
+    height, width, _ = image.shape
+    rows = np.hstack((np.zeros((height, 1), np.uint8), image.reshape(height, width * 3)))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows.tobytes()))
+        + chunk(b"IEND", b"")
+    )
+
+
+def install():
+    """Makes this module the game's `emulator`, with an `ion` reading
+    keys_down, and the virtual clock its time.monotonic()"""
+    module = sys.modules[__name__]
+    sys.modules["emulator"] = module
+
+    ion = types.ModuleType("ion")
+    for key in KEYS:
+        setattr(ion, "KEY_" + key, key)
+    ion.keydown = keydown
+    sys.modules["ion"] = ion
+
+    time.monotonic = monotonic
+    return module
+
+
+class Stop(Exception):
+    """Raised by update() to end a run of the game loop"""
+
+
+def key_schedule(specs):
+    """{frame: keys held} from "frame:KEY" or "first-last:KEY" specs"""
+    schedule = {}
+    for spec in specs:
+        frames_spec, key = spec.split(":")
+        if key not in KEYS:
+            raise SystemExit(f"unknown key {key}, expected one of {', '.join(KEYS)}")
+        first, _, last = frames_spec.partition("-")
+        first = int(first)
+        last = int(last) if last else first + KEY_FRAMES - 1
+        for frame in range(first, last + 1):
+            schedule.setdefault(frame, set()).add(key)
+    return schedule
+
+
+def run_script(path, schedule=None, frames=None, png_dir=None, every=1):
+    """Runs a game script until its frame limit, returns frames per second"""
+    emulator = install()
+    schedule = schedule or {}
+
+    def next_frame(frame):
+        keys_down.clear()
+        keys_down.update(schedule.get(frame, ()))
+        if png_dir and frame % every == 0:
+            (png_dir / f"frame_{frame:06d}.png").write_bytes(png())
+        if frames is not None and frame >= frames:
+            raise Stop
+
+    emulator.on_update.append(next_frame)
+    keys_down.update(schedule.get(0, ()))
+    source = Path(path).read_text()
+    start = time.perf_counter()
+    try:
+        exec(compile(source, str(path), "exec"), {"__name__": "gd"})
+    except Stop:
+        pass
+    return emulator.frames / (time.perf_counter() - start)
+
+
+def main():
+    global realtime, frame_rate
+    from headless import GAME_SCRIPT
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", nargs="?", type=Path, default=GAME_SCRIPT, help="game script to run")
+    parser.add_argument("--frames", type=int, default=300, help="frames to run")
+    parser.add_argument("--keys", nargs="*", default=[], help="keys to press, as frame:KEY")
+    parser.add_argument("--png", type=Path, help="directory to save frames to")
+    parser.add_argument("--every", type=int, default=1, help="save one frame out of this many")
+    parser.add_argument("--realtime", action="store_true", help="run at the game's own speed")
+    parser.add_argument("--fps", type=int, default=frame_rate, help="frames per second drawn in a level")
+    args = parser.parse_args()
+
+    realtime = args.realtime
+    frame_rate = args.fps
+    if args.png:
+        args.png.mkdir(parents=True, exist_ok=True)
+    rate = run_script(args.script, key_schedule(args.keys), args.frames, args.png, args.every)
+    print(f"{frames} frames, {rate:.0f} frames/s, {clock:.1f} s of game time")
+
+
+if __name__ == "__main__":
+    main()
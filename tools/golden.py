@@ -0,0 +1,185 @@
+"""Checks that the game still draws exactly the same frames.
+
+Scripted traces are played through the game's own loop on the NumPy screen
+of `emulator.py`: every replay of `tools/replays.json` (each built-in level
+won, never jumping and always jumping), a walk through the menus, and level 1
+entered from the menus then restarted with SHIFT and after dying. Each
+frame's screen is hashed and compared with the golden hashes in
+`tools/golden.json`, and every attempt must start with a frame of its first
+position and then play exactly one tick per frame. For the first frame that
+differs, a diff image is saved next to the reference frame drawn by the
+committed script (or `--reference`): expected, actual, and the differing
+pixels in magenta.
+
+    python tools/golden.py             # check, exits with status 1 on a difference
+    python tools/golden.py --record    # record new golden hashes
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import emulator
+from headless import GAME_SCRIPT
+from replay import CORPUS
+
+GOLDEN = Path(__file__).resolve().parent / "golden.json"
+
+# Main menu, garage, back, level menu and back
+MENU_KEYS = (
+    "5:LEFT", "10:OK", "15:RIGHT", "20:RIGHT", "25:OK", "30:LEFT", "35:BACKSPACE",
+    "40:RIGHT", "45:LEFT", "50:OK", "55:RIGHT", "60:RIGHT", "65:LEFT", "70:BACKSPACE",
+)
+MENU_FRAMES = 75
+
+# Level 1 from the menus, restarted with SHIFT, then dying and respawning
+RESTART_KEYS = ("5:OK", "15:OK", "30-30:SHIFT")
+RESTART_FRAMES = 100
+
+
+def traces():
+    """{name: (level number or None, replay or (key specs, frames))}"""
+    found = {
+        "menus": (None, (MENU_KEYS, MENU_FRAMES)),
+        "restarts": (None, (RESTART_KEYS, RESTART_FRAMES)),
+    }
+    for i, entry in enumerate(json.loads(CORPUS.read_text())):
+        found[f"level{entry['level']}-{i}-{entry['result']}"] = (entry["level"], entry["replay"])
+    return found
+
+
+def load(script):
+    emulator.install()
+    emulator.autostart = False
+    spec = importlib.util.spec_from_file_location("gd", script)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    return game
+
+
+def play(script, trace, last_frame=None):
+    """Plays a trace from a fresh game. Returns the hash of every frame, the
+    ticks played by each attempt in its first two frames, and the screen of
+    last_frame if given."""
+    level, inputs = trace
+    emulator.screen[:] = 0
+    emulator.clock = 0.0
+    emulator.frames = 0
+    emulator.keys_down.clear()
+    emulator.on_update.clear()
+    random.seed(0)
+    game = load(script)
+
+    hashes = []
+    kept = []
+    starts = {}  # {attempt: [ticks]}
+    schedule = emulator.key_schedule(inputs[0]) if level is None else {}
+
+    def check(frame):
+        hashes.append(hashlib.sha1(emulator.screen.tobytes()).hexdigest()[:16])
+        if game.menu == "level":
+            ticks = starts.setdefault(game.attempts, [])
+            if len(ticks) < 2:
+                ticks.append(game.run.ticks)
+        if frame == last_frame:
+            kept.append(emulator.screen.copy())
+            raise emulator.Stop
+        emulator.keys_down.clear()
+        emulator.keys_down.update(schedule.get(frame, ()))
+        if level is None and frame >= inputs[1]:
+            raise emulator.Stop
+        if level is not None and game.timer_end is not None:  # The attempt ended
+            raise emulator.Stop
+
+    emulator.on_update.append(check)
+    if level is not None:
+        game.REPLAY = (level, inputs)
+    emulator.keys_down.update(schedule.get(0, ()))
+    try:
+        game.main()
+    except emulator.Stop:
+        pass
+    return hashes, starts, kept[0] if kept else None
+
+
+def reference_script():
+    """The game script as last committed"""
+    root = GAME_SCRIPT.parent.parent
+    path = GAME_SCRIPT.relative_to(root).as_posix()
+    source = subprocess.run(
+        ["git", "show", f"HEAD:{path}"], cwd=root, capture_output=True, check=True
+    ).stdout
+    reference = Path(tempfile.mkdtemp()) / GAME_SCRIPT.name
+    reference.write_bytes(source)
+    return reference
+
+
+def diff_image(expected, actual):
+    changed = (expected != actual).any(axis=2)
+    marked = actual // 3
+    marked[changed] = (255, 0, 255)
+    gap = np.full((expected.shape[0], 4, 3), 128, np.uint8)
+    return np.hstack((expected, gap, actual, gap, marked))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script to check")
+    parser.add_argument("--reference", type=Path, help="script drawing the golden frames, for diff images")
+    parser.add_argument("--record", action="store_true", help="record the golden hashes")
+    parser.add_argument("--diffs", type=Path, default=Path("golden_diffs"), help="where to save diff images")
+    args = parser.parse_args()
+
+    if args.record:
+        golden = {name: play(args.script, trace)[0] for name, trace in traces().items()}
+        GOLDEN.write_text("{\n" + ",\n".join(f"  {json.dumps(k)}: {json.dumps(v)}" for k, v in golden.items()) + "\n}\n")
+        print(f"Recorded {sum(map(len, golden.values()))} frames of {len(golden)} traces")
+        return
+
+    golden = json.loads(GOLDEN.read_text())
+    failed = 0
+    for name, trace in traces().items():
+        hashes, starts, _ = play(args.script, trace)
+        late = [(attempt, ticks) for attempt, ticks in starts.items() if ticks != [0, 1][:len(ticks)]]
+        if late:
+            attempt, ticks = late[0]
+            print(f"{name}: attempt {attempt} played {ticks} ticks by its first frames instead of [0, 1]")
+            failed += 1
+            continue
+        expected = golden.get(name)
+        if expected is None:
+            print(f"{name}: no golden frames, record them with --record")
+            failed += 1
+            continue
+
+        first = next((i for i, (a, b) in enumerate(zip(hashes, expected)) if a != b), None)
+        if first is None and len(hashes) == len(expected):
+            print(f"{name}: {len(hashes)} frames match")
+            continue
+
+        failed += 1
+        if first is None:
+            print(f"{name}: {len(hashes)} frames instead of {len(expected)}")
+            continue
+
+        frame = first + 1
+        _, _, actual = play(args.script, trace, frame)
+        _, _, reference = play(args.reference or reference_script(), trace, frame)
+        args.diffs.mkdir(parents=True, exist_ok=True)
+        image = args.diffs / f"{name}-frame{frame}.png"
+        image.write_bytes(emulator.png(diff_image(reference, actual)))
+        print(f"{name}: frame {frame} differs, see {image}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
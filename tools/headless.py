@@ -0,0 +1,103 @@
+"""Runs the NumWorks game script on a computer, without a screen or keyboard.
+
+The script is loaded with stub `emulator` and `ion` modules and with
+`autostart` turned off, so nothing is drawn and the game loop never starts.
+Its simulation core (`Run`, `step`) can then be driven at full speed:
+
+    python tools/headless.py            # every level, no input
+    python tools/headless.py --jump 3   # jump as soon as possible in level 3
+"""
+
+import argparse
+import importlib.util
+import sys
+import time
+import types
+from pathlib import Path
+
+GAME_SCRIPT = Path(__file__).resolve().parent.parent / "attached_assets" / "gd.V1.1.2_1769411210029.py"
+
+KEYS = ("KEY_OK", "KEY_EXE", "KEY_UP", "KEY_LEFT", "KEY_RIGHT", "KEY_BACKSPACE", "KEY_SHIFT")
+
+
+def stub_modules():
+    """Installs do-nothing `emulator` and `ion` modules"""
+    emulator = types.ModuleType("emulator")
+    emulator.fill_rect = lambda x, y, width, height, color: None
+    emulator.draw_string = lambda text, x, y, color=None, background=None: None
+    emulator.update = lambda: None
+    emulator.sleep = lambda seconds: None
+    emulator.autostart = False
+
+    ion = types.ModuleType("ion")
+    for i, key in enumerate(KEYS):
+        setattr(ion, key, i)
+    ion.keydown = lambda key: False
+
+    sys.modules["emulator"] = emulator
+    sys.modules["ion"] = ion
+
+
+def load_game(path=GAME_SCRIPT, name="gd"):
+    """Imports a game script (the template or any exported one) headless"""
+    stub_modules()
+    spec = importlib.util.spec_from_file_location(name, path)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    return game
+
+
+def select_level(game, level):
+    game.current_level = level
+    game.load_level()
+
+
+def play(game, level, inputs):
+    """Plays one attempt with a jump bit per tick.
+
+    Returns (events, ticks) of the tick that ended the attempt, or
+    (0, len(inputs)) if it is still running once the inputs run out.
+    """
+    select_level(game, level)
+    run = game.Run()
+    for jump in inputs:
+        events = game.step(run, jump)
+        if events & (game.DIED | game.FINISHED):
+            return events, run.ticks
+    return 0, run.ticks
+
+
+def stuck(run):
+    """Is the run left hanging in the air, by a pad taken while falling: it
+    is jumping, but the arc only goes on while it can jump. Real play does
+    not count on it, the run only moves again by dying or finishing."""
+    return run.is_jumping and not run.can_jump
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", nargs="*", type=int, help="level numbers, starting at 1 (default: all)")
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script to load")
+    parser.add_argument("--jump", action="store_true", help="hold jump during the whole attempt")
+    args = parser.parse_args()
+
+    game = load_game(args.script)
+    numbers = args.levels or range(1, len(game.levels) + 1)
+    for number in numbers:
+        level = number - 1
+        length = game.levels[level][2] * 10 // game.speed + 1
+
+        start = time.perf_counter()
+        events, ticks = play(game, level, [args.jump] * length)
+        elapsed = time.perf_counter() - start
+
+        result = "finished" if events & game.FINISHED else "died"
+        column = (game.player_x + ticks * game.speed) // 10
+        print(
+            f"{number}. {game.levels[level][5]}: {result} at tick {ticks} "
+            f"(column {column}), {ticks / elapsed:.0f} ticks/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Generates levels of any length and density for load and scaling tests.
+
+Levels are built in the exact shape of an entry of the script's `levels`
+list, SEGMENT tile columns at a time: ground with gaps, spikes, raised
+platforms and jump pads, about `density` objects per tile column. With
+`--beatable` every segment is played by the script's own physics before it
+is kept: all the ways to play the level so far (as in `verify.py`, none stuck
+in the air) are run through the previous segment and it, since the player
+already touches a segment before crossing into it, and it is drawn again
+until one of them gets past it. After a few failed draws the segment is plain ground.
+
+    python tools/levelgen.py --length 2000 --density 0.8          # JSON entry
+    python tools/levelgen.py --count 4 --beatable -o gd_gen.py    # game script
+
+Game scripts can get the levels packed, as strings of base 32 numbers that the
+game decodes while playing, which start much faster than lists.
+
+Game scripts get the generated levels after the built-in ones, which the
+garage's color unlocks refer to.
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+from headless import GAME_SCRIPT, load_game, stuck
+
+SEGMENT = 32  # Tile columns drawn at a time
+RUNWAY = 16  # Plain ground the level starts with
+TRIES = 20  # Draws of a segment before falling back to plain ground
+GROUND = 6  # Row of the ground platforms
+
+
+def random_segment(rng, start, density):
+    """Platforms, spikes and pads of the columns start to start + SEGMENT - 1"""
+    end = start + SEGMENT
+    platforms = []
+    spikes = []
+    pads = []
+
+    if rng.random() < 0.3:
+        gap = rng.randrange(start + 4, end - 6)
+        width = rng.randrange(2, 5)
+        platforms += [[start, GROUND, gap - start, 1], [gap + width, GROUND, end - gap - width, 1]]
+    else:
+        platforms.append([start, GROUND, SEGMENT, 1])
+
+    for _ in range(round(density * SEGMENT) - len(platforms)):
+        x = rng.randrange(start, end - 2)
+        kind = rng.random()
+        if kind < 0.45:
+            spikes.append([x, GROUND, 0])
+        elif kind < 0.75:
+            platforms.append([x, rng.randrange(3, GROUND), rng.randrange(2, min(9, end - x + 1)), 1])
+        elif kind < 0.9:
+            spikes.append([x, rng.randrange(3, GROUND), rng.randrange(2)])
+        else:
+            pads.append([x, GROUND - 1])
+    return platforms, spikes, pads
+
+
+def plain_segment(start):
+    return [[start, GROUND, SEGMENT, 1]], [], []
+
+
+class Player:
+    """Every distinct way to play the level so far, run segment by segment"""
+
+    def __init__(self, game):
+        self.game = game
+        self.slot = len(game.levels)
+        game.levels.append(None)
+        self.runs = [game.Run()]  # Alive when entering the last segment kept
+        self.entered = []  # Alive when entering the segment being tried
+
+    def cross(self, segments, start):
+        """Do runs get past the last of segments, which starts at column start.
+        Only the segments around it are loaded, shifted to start near column
+        0: the physics do not depend on where a level is."""
+        game = self.game
+        shift = max(start - 3 * SEGMENT, 0)
+        level = [[], [], start - shift + SEGMENT + 10, (0, 0, 0), (0, 0, 0), "", 0, 0, "", []]
+        for segment in segments[-4:]:
+            for kind, objects in zip((0, 1, 9), segment):
+                level[kind] += [[obj[0] - shift] + obj[1:] for obj in objects]
+        game.levels[self.slot] = level
+        game.current_level = self.slot
+        game.loaded_level = None
+        game.load_level()
+
+        runs = []
+        for run in self.runs:
+            run = run.copy()
+            run.map_offset_x += shift * 10
+            runs.append(run)
+
+        self.entered = None
+        start_x = (start - shift) * 10
+        end_x = start_x + SEGMENT * 10
+        while runs and game.player_x - runs[0].map_offset_x < end_x:
+            if self.entered is None and game.player_x - runs[0].map_offset_x >= start_x:
+                self.entered = [run.copy() for run in runs]
+            next_runs = {}
+            for run in runs:
+                for jump in (False, True):
+                    if jump and run.is_jumping:
+                        continue
+                    other = run.copy()
+                    if not game.step(other, jump) & game.DIED and not stuck(other):
+                        next_runs.setdefault(other.key(), other)
+            runs = list(next_runs.values())
+
+        for run in self.entered or ():
+            run.map_offset_x -= shift * 10
+        return bool(runs)
+
+    def keep(self):
+        """The segment tried last is kept"""
+        self.runs = self.entered
+
+
+def generate_level(length, density=0.5, seed=0, game=None, name=None):
+    """A levels entry about length columns long. If a game module is given,
+    the level is beatable with its physics."""
+    rng = random.Random(seed)
+    player = Player(game) if game else None
+    segments = [([[0, GROUND, RUNWAY, 1]], [], [])]
+
+    for start in range(RUNWAY, max(length, RUNWAY + SEGMENT), SEGMENT):
+        for _ in range(TRIES):
+            segment = random_segment(rng, start, density)
+            if not player:
+                break
+            if player.cross(segments + [segment], start):
+                break
+        else:
+            segment = plain_segment(start)
+            if not player.cross(segments + [segment], start):
+                raise RuntimeError(f"no run gets past column {start}")
+        if player:
+            player.keep()
+        segments.append(segment)
+
+    if player:
+        del game.levels[player.slot]
+
+    platforms = [obj for segment in segments for obj in segment[0]]
+    spikes = [obj for segment in segments for obj in segment[1]]
+    pads = [obj for segment in segments for obj in segment[2]]
+    end = segments[-1][0][0][0] + SEGMENT
+    hue = rng.randrange(3)
+    background = tuple(200 if i == hue else 60 for i in range(3))
+    ground = tuple(70 if i == hue else 0 for i in range(3))
+    name = name or f"Generated {seed}"
+    return [platforms, spikes, end, background, ground, name, 0, 0, "levelgen", pads]
+
+
+# Packed levels, as the editor's optimized export writes them, encoded by the
+# game script's own pack_record() with its *_FIELDS widths
+
+
+def pack(objects, fields, game):
+    """Objects sorted by x as a string of fixed width base 32 numbers, or the
+    objects as they are if a number does not fit its field"""
+    if isinstance(objects, str):
+        return objects
+    records = []
+    for numbers in sorted(objects, key=lambda numbers: numbers[0]):
+        for number, width in zip(numbers, fields):
+            if not isinstance(number, int) or not 0 <= number < 32 ** width:
+                return objects
+        records.append(game.pack_record(numbers, fields))
+    return "".join(records)
+
+
+def objects_literal(objects):
+    return json.dumps(objects) if isinstance(objects, str) else str(objects)
+
+
+def level_literal(level, game=None):
+    """Source of a levels entry, packed by game if given"""
+    platforms, spikes, end, background, ground, name, best, attempts, author, pads = level
+    if game:
+        platforms = pack(platforms, game.PLATFORM_FIELDS, game)
+        spikes = pack(spikes, game.SPIKE_FIELDS, game)
+        pads = pack(pads, game.PAD_FIELDS, game)
+    return (
+        f"    [  # {name}\n        {objects_literal(platforms)},\n        {objects_literal(spikes)},\n"
+        f"        {end}, {background}, {ground}, {json.dumps(name)}, {best}, {attempts}, "
+        f"{json.dumps(author)}, {objects_literal(pads)}\n    ]"
+    )
+
+
+def levels_span(script):
+    """Where the `levels` list of a game script starts and ends, brackets included"""
+    start = script.index("levels = [") + len("levels = ")
+    depth = 0
+    for end in range(start, len(script)):
+        depth += {"[": 1, "]": -1}.get(script[end], 0)
+        if depth == 0:
+            return start, end + 1
+    raise ValueError("unterminated levels list")
+
+
+def write_script(levels, path, template=GAME_SCRIPT, packed=False):
+    """Copies the game script with levels added after its own"""
+    script = Path(template).read_text()
+    _, end = levels_span(script)
+    end -= 1
+    game = load_game(template) if packed else None
+    literals = ",\n".join(level_literal(level, game) for level in levels)
+    Path(path).write_text(script[:end].rstrip() + ",\n" + literals + "\n" + script[end:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--length", type=int, default=1000, help="tile columns per level")
+    parser.add_argument("--density", type=float, default=0.5, help="objects per tile column")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first level")
+    parser.add_argument("--count", type=int, default=1, help="levels to generate, one seed each")
+    parser.add_argument("--beatable", action="store_true", help="only keep segments the physics can beat")
+    parser.add_argument("-o", "--output", type=Path, help="game script to write (default: JSON to stdout)")
+    parser.add_argument("--packed", action="store_true", help="write the levels packed, faster to start")
+    args = parser.parse_args()
+
+    game = load_game() if args.beatable else None
+    levels = [
+        generate_level(args.length, args.density, seed, game)
+        for seed in range(args.seed, args.seed + args.count)
+    ]
+    if args.output:
+        write_script(levels, args.output, packed=args.packed)
+        count = sum(len(level[0]) + len(level[1]) + len(level[9]) for level in levels)
+        print(f"Wrote {len(levels)} levels, {count} objects, to {args.output}")
+    else:
+        print(json.dumps(levels[0] if args.count == 1 else levels))
+
+
+if __name__ == "__main__":
+    main()
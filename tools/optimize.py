@@ -0,0 +1,295 @@
+"""Rewrites the levels of a game script with fewer objects and the same gameplay.
+
+Platforms of whole tiles are merged into the fewest rectangles found, per
+group of touching platforms: rows of tiles stacked into rectangles, or
+columns put side by side, whichever gives fewer, and the original platforms
+when neither does. Duplicate spikes and pads are dropped, and so are spikes
+hidden inside solid tiles: platforms are drawn over them and any contact
+with them is a contact with the platform. Pads are drawn over platforms, so
+they are kept.
+
+Merging keeps the solid area of the level, but not the top of every
+platform, which is what the player stands and lands on. A group is only
+merged if the tops it changes are at positions where the player would be
+inside a platform, where no run ever is. Each optimized level is then
+checked against the original by the script's own `step()`: every run of
+every tick, as `verify.py` explores them, must make the same moves with the
+same events.
+
+    python tools/optimize.py                        # report on the built-in levels
+    python tools/optimize.py gd_edited.py -o gd_optimized.py
+
+Exits with status 1 if an optimized level does not play the same, which then
+is written unchanged.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from headless import GAME_SCRIPT, load_game, select_level
+from levelgen import level_literal, levels_span
+
+ROW_HEIGHT = 32  # Pixels per platform row
+TILE_WIDTH = 10
+
+
+def whole_tiles(platform):
+    return all(isinstance(n, int) for n in platform) and platform[2] > 0 and platform[3] > 0
+
+
+def cells_of(platforms):
+    return {
+        (x, y)
+        for px, py, w, h in platforms
+        for x in range(px, px + w)
+        for y in range(py, py + h)
+    }
+
+
+def groups(cells):
+    """Sets of cells touching each other by a side"""
+    left = set(cells)
+    while left:
+        group = {left.pop()}
+        todo = list(group)
+        while todo:
+            x, y = todo.pop()
+            for cell in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if cell in left:
+                    left.remove(cell)
+                    group.add(cell)
+                    todo.append(cell)
+        yield group
+
+
+def row_rectangles(cells):
+    """Runs of cells on each row, stacked when the rows below have the same"""
+    runs = {}  # (x, width) -> rows
+    for x, y in sorted(cells, key=lambda cell: (cell[1], cell[0])):
+        if (x - 1, y) not in cells:
+            width = 1
+            while (x + width, y) in cells:
+                width += 1
+            runs.setdefault((x, width), []).append(y)
+
+    rectangles = []
+    for (x, width), rows in runs.items():
+        top = rows[0]
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i] != rows[i - 1] + 1:
+                rectangles.append([x, top, width, rows[i - 1] - top + 1])
+                if i < len(rows):
+                    top = rows[i]
+    return rectangles
+
+
+def column_rectangles(cells):
+    """Runs of cells in each column, side by side when the next columns have the same"""
+    flipped = row_rectangles({(y, x) for x, y in cells})
+    return [[x, y, w, h] for y, x, h, w in flipped]
+
+
+# Intervals are sorted lists of disjoint [first, last] integer ranges
+
+def union(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if first > last:
+            continue
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+
+def subtract(a, b):
+    """Integers of a that are not in b"""
+    result = []
+    j = 0
+    for first, last in a:
+        while j < len(b) and b[j][1] < first:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= last:
+            if b[k][0] > first:
+                result.append([first, b[k][0] - 1])
+            first = max(first, b[k][1] + 1)
+            k += 1
+        if first <= last:
+            result.append([first, last])
+    return result
+
+
+def tops(platforms):
+    """{top y: (standing, landing)} x positions of the player's left side that
+    a platform top carries, as is_supported() and is_landing() test them"""
+    found = {}
+    for x, y, w, h in platforms:
+        left = x * TILE_WIDTH - 19
+        right = (x + w) * TILE_WIDTH
+        standing, landing = found.setdefault(y * ROW_HEIGHT, ([], []))
+        standing.append([left, right])
+        landing.append([left + 1, right + 19])
+    return {top: (union(s), union(l)) for top, (s, l) in found.items()}
+
+
+def blocked(platforms, top, game):
+    """x positions where the player, feet at top, is inside a platform"""
+    ranges = []
+    for x, y, w, h in platforms:
+        if w <= 0 or h <= 0:
+            continue
+        rx, ry = x * TILE_WIDTH, y * ROW_HEIGHT
+        if ry < top and ry + h * ROW_HEIGHT > top - game.PLAYER_HEIGHT:
+            ranges.append([rx - game.PLAYER_WIDTH + 1, rx + w * TILE_WIDTH - 1])
+    return union(ranges)
+
+
+def same_support(before, after, solid, game):
+    """Do two sets of platforms carry the player the same wherever it can be.
+    The player can only be where it is not inside solid, or at its start."""
+    old, new = tops(before), tops(after)
+    start = [[game.player_x, game.player_x]]
+    start_top = game.Run().player_y + game.PLAYER_HEIGHT
+    for top in set(old) | set(new):
+        free_blocked = blocked(solid, top, game)
+        if top == start_top:
+            free_blocked = subtract(free_blocked, start)
+        for kind in (0, 1):
+            a = old.get(top, ([], []))[kind]
+            b = new.get(top, ([], []))[kind]
+            if subtract(subtract(a, b), free_blocked) or subtract(subtract(b, a), free_blocked):
+                return False
+    return True
+
+
+def merge_platforms(platforms, game):
+    """Fewest rectangles covering the whole tile platforms, group by group"""
+    kept = [p for p in platforms if not whole_tiles(p)]
+    whole = [list(p) for p in platforms if whole_tiles(p)]
+    unique = []
+    for platform in whole:
+        if platform not in unique:
+            unique.append(platform)
+
+    cells = cells_of(unique)
+    for group in groups(cells):
+        originals = [p for p in unique if (p[0], p[1]) in group]
+        best = originals
+        for candidate in (row_rectangles(group), column_rectangles(group)):
+            if len(candidate) < len(best) and same_support(originals, candidate, platforms, game):
+                best = candidate
+        kept += best
+    return sorted(kept, key=lambda p: (p[0], p[1]))
+
+
+def hidden_spike(spike, cells):
+    """Is the whole square a spike is drawn in made of solid tiles"""
+    x, y, orientation = spike
+    if not all(isinstance(n, int) for n in spike):
+        return False
+    row = y if orientation else y - 1  # Spikes are 20 pixels tall, within a row
+    return (x - 1, row) in cells and (x, row) in cells
+
+
+def optimize_level(level, game):
+    platforms = [list(p) for p in game.unpack(level[0], game.PLATFORM_FIELDS)]
+    spikes = [list(s) for s in game.unpack(level[1], game.SPIKE_FIELDS)]
+    pads = [list(p) for p in game.unpack(level[9], game.PAD_FIELDS)]
+
+    cells = cells_of([p for p in platforms if whole_tiles(p)])
+    new_spikes = []
+    for spike in spikes:
+        if spike not in new_spikes and not hidden_spike(spike, cells):
+            new_spikes.append(spike)
+    new_pads = []
+    for pad in pads:
+        if pad not in new_pads:
+            new_pads.append(pad)
+
+    optimized = list(level)
+    optimized[0] = merge_platforms(platforms, game)
+    optimized[1] = sorted(new_spikes)
+    optimized[9] = sorted(new_pads)
+    return optimized
+
+
+def explore(game, level):
+    """Every move of every distinct run, tick by tick, as in verify.py"""
+    select_level(game, level)
+    runs = [game.Run()]
+    while runs:
+        moves = set()
+        next_runs = {}
+        for run in runs:
+            for jump in (False, True):
+                if jump and run.is_jumping:
+                    continue
+                other = run.copy()
+                events = game.step(other, jump)
+                moves.add((run.key(), jump, events, other.key()))
+                if not events & (game.DIED | game.FINISHED):
+                    next_runs.setdefault(other.key(), other)
+        yield moves
+        runs = list(next_runs.values())
+
+
+def same_gameplay(original, optimized, level):
+    """Returns the ticks checked, or None if a tick differs"""
+    ticks = 0
+    for a, b in zip(explore(original, level), explore(optimized, level)):
+        if a != b:
+            return None
+        ticks += 1
+    # Both ran out of runs at the same tick only if they did not differ before
+    return ticks
+
+
+def object_counts(level, game):
+    return tuple(
+        len(game.unpack(level[kind], fields))
+        for kind, fields in ((0, game.PLATFORM_FIELDS), (1, game.SPIKE_FIELDS), (9, game.PAD_FIELDS))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", nargs="?", type=Path, default=GAME_SCRIPT, help="game script to optimize")
+    parser.add_argument("-o", "--output", type=Path, help="game script to write")
+    parser.add_argument("--packed", action="store_true", help="write the levels packed, faster to start")
+    args = parser.parse_args()
+
+    original = load_game(args.script)
+    optimized = load_game(args.script, "gd_optimized")
+    failed = 0
+    levels = []
+    for level in range(len(original.levels)):
+        entry = optimize_level(original.levels[level], original)
+        optimized.levels[level] = entry
+        optimized.loaded_level = None
+        ticks = same_gameplay(original, optimized, level)
+
+        before = object_counts(original.levels[level], original)
+        after = object_counts(entry, original)
+        counts = ", ".join(f"{kind} {a} -> {b}" for kind, a, b in zip(("platforms", "spikes", "pads"), before, after))
+        if ticks is None:
+            failed += 1
+            entry = original.levels[level]
+            print(f"{level + 1}. {entry[5]}: plays differently, left as is ({counts})")
+        else:
+            print(f"{level + 1}. {entry[5]}: {counts}, same moves over {ticks} ticks")
+        levels.append(entry)
+
+    if args.output:
+        script = args.script.read_text()
+        start, end = levels_span(script)
+        literals = ",\n".join(level_literal(level, original if args.packed else None) for level in levels)
+        args.output.write_text(script[:start] + "[\n" + literals + "\n]" + script[end:])
+        print(f"Wrote {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Plays replays of the game headless, as a regression and speed test.
+
+A replay is the jump input of an attempt as the game records it (see
+`read_jump()` in the script): run lengths of the jump bit, starting with not
+jumping. The corpus in `tools/replays.json` stores replays of every level with
+the result and tick they ended at, and playing them back must end the same:
+
+    python tools/replay.py                      # check the corpus, with ticks/s
+    python tools/replay.py --script gd_edited.py
+    python tools/replay.py --record             # rebuild the corpus
+
+The corpus is recorded from the winning trace `verify.py` finds for each
+level, and from attempts that never jump and that always jump.
+
+Exits with status 1 if a replay does not end as recorded.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from headless import GAME_SCRIPT, load_game, select_level
+
+CORPUS = Path(__file__).resolve().parent / "replays.json"
+
+
+def encode(game, inputs):
+    """Replay of a list of jump bits, by the game's own recorder"""
+    game.restart_replay()
+    for jump in inputs:
+        game.record_jump(jump)
+    return game.recording
+
+
+def play_replay(game, level, runs):
+    """Plays one attempt of a level fed by a replay, until it ends.
+
+    Returns (events, ticks) of the last tick.
+    """
+    select_level(game, level)
+    game.replay = runs
+    game.restart_replay()
+    run = game.Run()
+    limit = game.levels[level][2] * 10 // game.speed + 1  # The end wall is reached by then
+    while run.ticks <= limit:
+        events = game.step(run, game.read_jump())
+        if events & (game.DIED | game.FINISHED):
+            break
+    game.stop_replay()
+    return events, run.ticks
+
+
+def result_name(game, events):
+    return "finished" if events & game.FINISHED else "died"
+
+
+def record(game):
+    import verify
+
+    verify.game = game
+    corpus = []
+    for level in range(len(game.levels)):
+        length = game.levels[level][2] * 10 // game.speed + 1
+        inputs, _ = verify.solve(level)
+        attempts = [[False] * length, [True] * length]
+        if inputs is not None:
+            attempts.insert(0, inputs)
+
+        for inputs in attempts:
+            events, ticks = play_replay(game, level, encode(game, inputs))
+            corpus.append({
+                "level": level + 1,
+                "result": result_name(game, events),
+                "ticks": ticks,
+                "replay": list(game.recording),  # Only the ticks played
+            })
+
+    CORPUS.write_text("[\n" + ",\n".join("  " + json.dumps(entry) for entry in corpus) + "\n]\n")
+    print(f"Recorded {len(corpus)} replays in {CORPUS.name}")
+
+
+def check(game):
+    corpus = json.loads(CORPUS.read_text())
+    failed = 0
+    total_ticks = 0
+    total_time = 0
+
+    for entry in corpus:
+        level = entry["level"] - 1
+        start = time.perf_counter()
+        events, ticks = play_replay(game, level, entry["replay"])
+        elapsed = time.perf_counter() - start
+        total_ticks += ticks
+        total_time += elapsed
+
+        result = result_name(game, events)
+        expected = f"{entry['result']} at tick {entry['ticks']}"
+        name = f"{entry['level']}. {game.levels[level][5]}"
+        if (result, ticks) != (entry["result"], entry["ticks"]) or game.recording != entry["replay"]:
+            failed += 1
+            print(f"{name}: {result} at tick {ticks}, expected {expected}")
+        else:
+            print(f"{name}: {expected}, {ticks / elapsed:.0f} ticks/s")
+
+    print(f"{len(corpus) - failed}/{len(corpus)} replays match, {total_ticks / total_time:.0f} ticks/s overall")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script to play")
+    parser.add_argument("--record", action="store_true", help="rebuild the corpus instead of checking it")
+    args = parser.parse_args()
+
+    game = load_game(args.script)
+    if args.record:
+        record(game)
+    else:
+        sys.exit(1 if check(game) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measures how long a game script takes to start, up to its first frame.
+
+The script runs on the NumPy screen of `emulator.py` until its first
+update(), the main menu (or a replay's first frame) being drawn. Three times
+are taken, the fastest of a few runs each: compiling the source, as the
+calculator does on every start, running the module body alone, which builds
+levels and tables, and running it up to the first frame.
+
+    python tools/startup.py
+    python tools/levelgen.py --count 20 --length 2000 --packed -o gd_pack.py
+    python tools/startup.py gd_pack.py
+
+On the calculator, `STARTUP_TIMING = True` in the script prints its own time
+to first frame.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import emulator
+from headless import GAME_SCRIPT
+
+
+def start(code, first_frame):
+    """Seconds to run the module body, and its main() until the first frame"""
+    emulator.screen[:] = 0
+    emulator.clock = 0.0
+    emulator.frames = 0
+    emulator.keys_down.clear()
+    emulator.on_update.clear()
+    emulator.autostart = first_frame
+
+    def stop(frame):
+        raise emulator.Stop
+
+    emulator.on_update.append(stop)
+    begin = time.perf_counter()
+    try:
+        exec(code, {"__name__": "gd"})
+    except emulator.Stop:
+        pass
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", nargs="?", type=Path, default=GAME_SCRIPT, help="game script to start")
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="runs to keep the fastest of")
+    args = parser.parse_args()
+
+    emulator.install()
+    source = args.script.read_text()
+    compiling = []
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        code = compile(source, str(args.script), "exec")
+        compiling.append(time.perf_counter() - begin)
+    body = min(start(code, False) for _ in range(args.repeat))
+    total = min(start(code, True) for _ in range(args.repeat))
+    print(f"Compile: {min(compiling) * 1000:.2f} ms", file=sys.stderr)
+    print(f"Module body: {body * 1000:.2f} ms", file=sys.stderr)
+    print(f"First frame: {total * 1000:.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
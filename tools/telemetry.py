@@ -0,0 +1,118 @@
+"""Reads the telemetry exported by the game: where each level kills players
+and drops frames.
+
+With `PRINT_TELEMETRY = True`, the game prints `Telemetry: ...` when a level is
+left, a string of every level played in the session. Any number of them, from
+one player or many, are added up here. Each level gets its totals and two
+heatmaps over its length, the deaths and the frames longer than RENDER_TICK,
+from the start of the level on the left to its end wall on the right.
+
+    python tools/telemetry.py 0000...            # strings printed by the game
+    python tools/telemetry.py --replays          # from playing tools/replays.json
+
+`--replays` plays each replay in the emulator, as `golden.py` does, and adds
+up the telemetry of every session. Its frame times are those of the
+emulator's virtual clock, which only moves while the game sleeps: they are
+zero, only exports from a calculator tell about late frames.
+"""
+
+import argparse
+import importlib.util
+import json
+from pathlib import Path
+
+import emulator
+from headless import GAME_SCRIPT, load_game
+from replay import CORPUS
+
+SHADES = " .:-=+*#%@"
+
+
+def heatmap(counts):
+    """A character per bin, darker with more counts, relative to the largest"""
+    top = max(counts)
+    if not top:
+        return " " * len(counts)
+    return "".join(SHADES[(count * (len(SHADES) - 1) + top - 1) // top] for count in counts)
+
+
+def add_up(game, exports):
+    """{level: record} summed over the exported strings"""
+    levels = {}
+    for export in exports:
+        for record in game.unpack(export, game.TELEMETRY_FIELDS):
+            level, values = record[0], record[1:]
+            total = levels.setdefault(level, [0] * len(values))
+            for i, value in enumerate(values):
+                if i in (game.LONGEST_TICKS, game.SLOWEST_FRAME_MS):
+                    total[i] = max(total[i], value)
+                else:
+                    total[i] += value
+    return levels
+
+
+def report(game, levels):
+    bins = game.TELEMETRY_BINS
+    lines = []
+    for level, record in sorted(levels.items()):
+        name = game.levels[level][5] if level < len(game.levels) else "?"
+        ended = record[game.DEATHS] + record[game.FINISHES]
+        frames = max(record[game.FRAMES], 1)
+        lines += [
+            f"{level + 1}. {name}: {record[game.ATTEMPTS]} attempts, {record[game.DEATHS]} deaths, "
+            f"{record[game.FINISHES]} finishes",
+            f"   {record[game.TICKS_PLAYED] / max(ended, 1):.0f} ticks per attempt ended, "
+            f"{record[game.LONGEST_TICKS]} at most",
+            f"   {record[game.FRAMES]} frames, {record[game.LATE_FRAMES]} late, "
+            f"{record[game.FRAME_MS] / frames:.1f} ms on average, {record[game.SLOWEST_FRAME_MS]} ms at most",
+            f"   deaths      |{heatmap(record[:bins])}|",
+            f"   late frames |{heatmap(record[bins:2 * bins])}|",
+        ]
+    return "\n".join(lines)
+
+
+def play_replays(script):
+    """The exported telemetry of a session per replay of the corpus"""
+    exports = []
+    for entry in json.loads(CORPUS.read_text()):
+        emulator.install()
+        emulator.autostart = False
+        emulator.clock = 0.0
+        emulator.on_update.clear()
+        spec = importlib.util.spec_from_file_location("gd", script)
+        game = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(game)
+
+        def stop(frame):
+            if game.timer_end is not None:  # The attempt ended
+                raise emulator.Stop
+
+        emulator.on_update.append(stop)
+        game.REPLAY = (entry["level"], entry["replay"])
+        try:
+            game.main()
+        except emulator.Stop:
+            pass
+        exports.append(game.export_telemetry())
+    return exports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("exports", nargs="*", help="strings printed after \"Telemetry: \"")
+    parser.add_argument("--script", type=Path, default=GAME_SCRIPT, help="game script they come from")
+    parser.add_argument("--replays", action="store_true", help="play the replays of tools/replays.json")
+    args = parser.parse_args()
+
+    exports = list(args.exports)
+    if args.replays:
+        exports += play_replays(args.script)
+    if not exports:
+        parser.error("no telemetry, give exported strings or --replays")
+
+    game = load_game(args.script)
+    print(report(game, add_up(game, exports)))
+
+
+if __name__ == "__main__":
+    main()
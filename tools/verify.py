@@ -0,0 +1,112 @@
+"""Proves that every level of a game script can be completed.
+
+Each level is solved by a breadth-first search over the jump/no-jump input of
+every tick, driven by the script's own `step()`. All the runs of a tick share
+the same scroll position, so runs with the same `Run.key()` are merged. Runs
+left stuck in the air by a pad taken while falling are dropped, so a level is
+only completable by real play. The search either finds a winning input trace
+or the first column that no input gets past. Levels are verified in parallel, one per process.
+
+    python tools/verify.py                   # the built-in levels
+    python tools/verify.py gd_edited.py -v   # an exported script, with traces
+
+Exits with status 1 if a level cannot be completed.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from headless import GAME_SCRIPT, load_game, play, select_level, stuck
+
+game = None  # Loaded once per worker process
+
+
+def load_worker(script):
+    global game
+    game = load_game(script)
+
+
+def solve(level):
+    """Returns (winning inputs, None) or (None, tick the last run died at)"""
+    select_level(game, level)
+    runs = [(game.Run(), None)]  # (run, (previous node, jump))
+    died_at = 0
+
+    while runs:
+        next_runs = {}
+        for node in runs:
+            run = node[0]
+            for jump in (False, True):
+                if jump and run.is_jumping:
+                    continue  # Jumping is ignored mid-air, same run as without
+
+                other = run.copy()
+                events = game.step(other, jump)
+                if events & game.FINISHED:
+                    return trace((other, (node, jump))), None
+                if events & game.DIED or stuck(other):
+                    died_at = other.ticks
+                    continue
+                next_runs.setdefault(other.key(), (other, (node, jump)))
+        runs = list(next_runs.values())
+
+    return None, died_at
+
+
+def trace(node):
+    inputs = []
+    while node[1]:
+        node, jump = node[1]
+        inputs.append(jump)
+    inputs.reverse()
+    return inputs
+
+
+def verify(level):
+    inputs, died_at = solve(level)
+    if inputs is not None:
+        # The trace must also win when replayed from the start
+        events, _ = play(game, level, inputs)
+        assert events & game.FINISHED, "winning trace does not replay"
+    return level, inputs, died_at
+
+
+def column_at(tick):
+    return (game.player_x + tick * game.speed) // 10
+
+
+def jump_ticks(inputs):
+    return [tick for tick, jump in enumerate(inputs) if jump]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", nargs="?", type=Path, default=GAME_SCRIPT, help="game script to verify")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the ticks to jump at")
+    args = parser.parse_args()
+
+    load_worker(args.script)
+    count = len(game.levels)
+
+    failed = 0
+    with ProcessPoolExecutor(args.jobs, initializer=load_worker, initargs=(args.script,)) as pool:
+        for level, inputs, died_at in pool.map(verify, range(count)):
+            name = game.levels[level][5]
+            if inputs is None:
+                failed += 1
+                print(f"{level + 1}. {name}: IMPOSSIBLE, every run dies by column {column_at(died_at)}")
+                continue
+
+            print(f"{level + 1}. {name}: completed in {len(inputs)} ticks with {sum(inputs)} jumps")
+            if args.verbose:
+                print("   jump at ticks", " ".join(map(str, jump_ticks(inputs))))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()